@@ -1,18 +1,46 @@
-from captchai.core.models.config import AvailableResolvers
+from threading import Lock
+
 from captchai.core.models.config import CaptchaGlobalConfig
+from captchai.core.models.config import ResolverName
+from captchai.core.models.labels import LabelIndexStats
 from captchai.core.provider.aws.providers import AWSProviderCaptcha
 
 
 class CaptchaSolver:
+    """Entry point for solving captchas.
+
+    A single solver can be shared by many threads. Providers are created once
+    per resolver and reused, so the API clients are shared as well. The
+    configuration is copied on construction and must not be mutated afterwards.
+    """
+
     def __init__(self, config: CaptchaGlobalConfig):
-        self.config = config
+        self.config = config.model_copy(deep=True)
+        # Shared by every resolver of this solver
+        self.label_index = self.config.label_index
+        self._providers: dict[ResolverName, AWSProviderCaptcha] = {}
+        self._lock = Lock()
 
-    def _create_aws_provider(
-        self, config: CaptchaGlobalConfig, resolver: AvailableResolvers
-    ):
-        return AWSProviderCaptcha(
-            config, self.config.aws_provider_config.default_image_resolver
-        )
+    def label_stats(self) -> LabelIndexStats:
+        """Returns how model labels matched queries across all resolvers.
+
+        Synonym and plural matches show which mismatches the label index rescued.
+        Near misses show the labels that made cascades escalate.
+        """
+        return self.label_index.stats()
+
+    def _create_aws_provider(self, config: CaptchaGlobalConfig, resolver: ResolverName):
+        return AWSProviderCaptcha(config, resolver)
+
+    def _get_aws_provider(self, resolver: ResolverName) -> AWSProviderCaptcha:
+        provider = self._providers.get(resolver)
+        if provider is None:
+            with self._lock:
+                provider = self._providers.get(resolver)
+                if provider is None:
+                    provider = self._create_aws_provider(self.config, resolver)
+                    self._providers[resolver] = provider
+        return provider
 
     def solve_aws_captcha_image(self, data: str, query: str):
         """Solve an AWS image captcha.
@@ -24,8 +52,8 @@ class CaptchaSolver:
         Returns:
             The captcha solution from the resolver
         """
-        resolver: AWSProviderCaptcha = self._create_aws_provider(
-            self.config, self.config.aws_provider_config.default_image_resolver
+        resolver: AWSProviderCaptcha = self._get_aws_provider(
+            self.config.aws_provider_config.default_image_resolver
         )
         return resolver.solve(data, query=query)
 
@@ -38,7 +66,22 @@ class CaptchaSolver:
         Returns:
             The captcha solution from the resolver
         """
-        resolver: AWSProviderCaptcha = self._create_aws_provider(
-            self.config, self.config.aws_provider_config.default_audio_resolver
+        resolver: AWSProviderCaptcha = self._get_aws_provider(
+            self.config.aws_provider_config.default_audio_resolver
         )
         return resolver.solve(data)
+
+    def solve_aws_captcha_audio_batch(self, data: list[str]) -> list:
+        """Solve several AWS audio captchas, batching them where possible.
+
+        Args:
+            data: Base64 encoded strings of the audio data
+
+        Returns:
+            One captcha solution per clip, in order. A clip that could not be
+            solved gets the exception it raised instead.
+        """
+        resolver: AWSProviderCaptcha = self._get_aws_provider(
+            self.config.aws_provider_config.default_audio_resolver
+        )
+        return resolver.solve_batch(data)
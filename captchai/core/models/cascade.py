@@ -0,0 +1,10 @@
+from captchai.core.models.config import CaptchaResponse
+from captchai.core.models.config import ResolverName
+
+
+class CascadeCaptchaResponse(CaptchaResponse[list[bool]]):
+    """Grid solution from a cascade, with the cells that were escalated."""
+
+    first_resolver: ResolverName
+    escalation_resolver: ResolverName
+    escalated_cells: list[int]
@@ -1,8 +1,18 @@
 from enum import Enum
+from pathlib import Path
+from typing import Annotated
 from typing import Generic
 from typing import TypeVar
 
 from pydantic import BaseModel
+from pydantic import BeforeValidator
+from pydantic import Field
+from pydantic import PrivateAttr
+from pydantic import model_validator
+
+from captchai.core.models.labels import DEFAULT_LABEL_SYNONYMS
+from captchai.core.models.labels import LabelIndex
+from captchai.core.provider.aws.tiles import EncodingCache
 
 
 T = TypeVar("T")
@@ -14,29 +24,174 @@ class AvailableResolvers(Enum):
     GROQ_AUDIO = "groq_audio"
     MOONDREAM_IMAGE_ONE_SHOOT = "moondream_image_one_shoot"
     MOONDREAM_IMAGE_MULTI_SHOOT = "moondream_image_multi_shoot"
+    ENSEMBLE_IMAGE = "ensemble_image"
+    CASCADE_IMAGE = "cascade_image"
+
+
+def to_resolver_name(value):
+    """Returns the built-in resolver for ``value`` when there is one."""
+    if isinstance(value, str):
+        try:
+            return AvailableResolvers(value)
+        except ValueError:
+            return value
+    return value
+
+
+def validate_resolver_name(value):
+    """Returns the resolver name for ``value``, checked against the registry.
+
+    Raises:
+        ValueError: If no resolver is registered under ``value``
+    """
+    # Imported here because the registry module imports this one
+    from captchai.core.provider.aws.providers import RESOLVERS
+
+    name = to_resolver_name(value)
+    if isinstance(name, str) and name not in RESOLVERS:
+        raise ValueError(
+            f"Unknown resolver '{name}', register it with register_resolver first"
+        )
+    return name
+
+
+# Built-in resolvers are referred to by AvailableResolvers members, resolvers
+# registered by third parties by the name they were registered with.
+ResolverName = Annotated[
+    AvailableResolvers | str, BeforeValidator(validate_resolver_name)
+]
 
 
 class CaptchaResponse(BaseModel, Generic[T]):
     """Generic response wrapper for different captcha implementations."""
 
     response: T
+    confidence: list[float] | None = None
+
+
+# Parametrising CaptchaResponse is a lookup that costs about as much as validating
+# a response, so resolvers use these instead of subscripting on every solve.
+GridCaptchaResponse = CaptchaResponse[list[bool]]
+WordsCaptchaResponse = CaptchaResponse[list[str]]
+
+
+class EnsembleConfig(BaseModel):
+    """Configuration for voting across several image resolvers.
+
+    A cell is marked as a match when the weight of the members that voted for it
+    is greater than ``quorum`` times the total weight. The default quorum is a
+    plain (weighted) majority.
+    """
+
+    members: list[ResolverName] = [
+        AvailableResolvers.GROQ_IMAGE_ONE_SHOOT,
+        AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT,
+        AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT,
+    ]
+    weights: list[float] | None = None
+    quorum: float = Field(default=0.5, ge=0, lt=1)
+    max_workers: int | None = None
+
+    @model_validator(mode="after")
+    def validate_members(self):
+        if not self.members:
+            raise ValueError("An ensemble needs at least one member")
+        if AvailableResolvers.ENSEMBLE_IMAGE in self.members:
+            raise ValueError("An ensemble cannot contain itself")
+        if self.weights is not None:
+            if len(self.weights) != len(self.members):
+                raise ValueError(
+                    f"Expected {len(self.members)} weights, got {len(self.weights)}"
+                )
+            if any(weight <= 0 for weight in self.weights):
+                raise ValueError("Ensemble weights must be positive")
+        return self
+
+    def member_weights(self) -> list[float]:
+        """Returns the weight of each member, defaulting to 1."""
+        if self.weights is None:
+            return [1.0] * len(self.members)
+        return list(self.weights)
+
+
+class CascadeConfig(BaseModel):
+    """Configuration for escalating uncertain cells to a tile resolver.
+
+    The ``first`` resolver answers the whole grid. Cells whose confidence is
+    below ``confidence_threshold`` are then asked again, one tile at a time, to
+    the ``escalation`` resolver, which must support tile calls.
+    """
+
+    first: ResolverName = AvailableResolvers.GROQ_IMAGE_ONE_SHOOT
+    escalation: ResolverName = AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT
+    confidence_threshold: float = Field(default=0.75, ge=0, le=1)
+
+    @model_validator(mode="after")
+    def validate_resolvers(self):
+        if AvailableResolvers.CASCADE_IMAGE in (self.first, self.escalation):
+            raise ValueError("A cascade cannot contain itself")
+        return self
+
+
+class AudioBatchConfig(BaseModel):
+    """Configuration for transcribing several audio clips in one request.
+
+    Up to ``max_clips`` clips are joined with ``gap_ms`` of silence between them
+    into a single upload. The transcript is split back per clip with its
+    timestamps. Clips whose share of the transcript is ambiguous are sent again
+    on their own.
+    """
+
+    max_clips: int = Field(default=8, ge=1)
+    gap_ms: int = Field(default=2000, ge=500)
 
 
 class AWSProviderConfig(BaseModel):
     image_size: tuple[float, float] = (640, 640)
     grid_size: int = 3
-    default_audio_resolver: AvailableResolvers = AvailableResolvers.GROQ_AUDIO
-    default_image_resolver: AvailableResolvers = AvailableResolvers.GROQ_IMAGE_ONE_SHOOT
-    list_resolver_image_fallback: list[AvailableResolvers] = [
+    tile_encoding_workers: int = Field(default=4, ge=1)
+    tile_encoding_quality: int = Field(default=75, ge=1, le=95)
+    default_audio_resolver: ResolverName = AvailableResolvers.GROQ_AUDIO
+    default_image_resolver: ResolverName = AvailableResolvers.GROQ_IMAGE_ONE_SHOOT
+    list_resolver_image_fallback: list[ResolverName] = [
         AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT,
         AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT,
         AvailableResolvers.GROQ_IMAGE_ONE_SHOOT,
         AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT,
         AvailableResolvers.MOONDREAM_IMAGE_MULTI_SHOOT,
     ]
-    list_resolver_audio_fallback: list[AvailableResolvers] = [
+    list_resolver_audio_fallback: list[ResolverName] = [
         AvailableResolvers.GROQ_AUDIO,
     ]
+    image_ensemble: EnsembleConfig = EnsembleConfig()
+    image_cascade: CascadeConfig = CascadeConfig()
+    audio_batch: AudioBatchConfig = AudioBatchConfig()
+    label_synonyms: dict[str, str] = DEFAULT_LABEL_SYNONYMS
+    # Challenges whose Moondream encodings are kept, at least the number of
+    # threads sharing a solver so none is evicted before it is escalated
+    encoding_cache_challenges: int = Field(default=32, ge=1)
+
+
+class CassetteMode(Enum):
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+class CassetteConfig(BaseModel):
+    """Record backend responses to a file, or replay them without network access.
+
+    In replay mode, ``replay_latency`` reproduces the latency of each recorded
+    call; otherwise responses are served immediately and resolvers skip their
+    rate limit pauses.
+    """
+
+    path: Path
+    mode: CassetteMode = CassetteMode.REPLAY
+    replay_latency: bool = False
+
+    @property
+    def is_instant_replay(self) -> bool:
+        return self.mode == CassetteMode.REPLAY and not self.replay_latency
 
 
 class CaptchaGlobalConfig(BaseModel):
@@ -45,3 +200,34 @@ class CaptchaGlobalConfig(BaseModel):
     groq_api_key: str
     moondream_api_key: str
     aws_provider_config: AWSProviderConfig
+    cassette: CassetteConfig | None = None
+
+    _label_index: LabelIndex = PrivateAttr()
+    _encoding_cache: EncodingCache = PrivateAttr()
+
+    def model_post_init(self, __context):
+        # Built here rather than on first use, so resolvers running on several
+        # threads never race to build them
+        self._label_index = LabelIndex(self.aws_provider_config.label_synonyms)
+        self._encoding_cache = EncodingCache(
+            self.aws_provider_config.encoding_cache_challenges
+        )
+
+    @property
+    def label_index(self) -> LabelIndex:
+        """The label index shared by every resolver built from this configuration.
+
+        It is built from ``aws_provider_config.label_synonyms``. Deep copies of
+        the configuration get their own index.
+        """
+        return self._label_index
+
+    @property
+    def encoding_cache(self) -> EncodingCache:
+        """Moondream encodings shared by every resolver built from this configuration.
+
+        A challenge asked again, or escalated from one-shoot to multi-shoot, is
+        not encoded twice. It holds ``aws_provider_config.encoding_cache_challenges``
+        challenges. Deep copies of the configuration get their own cache.
+        """
+        return self._encoding_cache
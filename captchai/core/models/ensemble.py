@@ -0,0 +1,38 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+from captchai.core.models.config import CaptchaResponse
+from captchai.core.models.config import ResolverName
+from captchai.core.models.solution import GridSolution
+
+
+class EnsembleMemberReport(BaseModel):
+    """Outcome of a single ensemble member for one solve.
+
+    ``cancelled`` members never started. ``abandoned`` members were still running
+    when the vote was decided: their call completes in the background and its
+    answer is ignored.
+    """
+
+    resolver: ResolverName
+    weight: float
+    status: Literal["ok", "error", "cancelled", "abandoned"]
+    latency: float | None = None
+    response: GridSolution | None = None
+    error: str | None = None
+
+
+class EnsembleReport(BaseModel):
+    """Agreement and cost of an ensemble solve."""
+
+    members: list[EnsembleMemberReport]
+    cell_agreement: list[float]
+    agreement: float
+    early_exit: bool
+
+
+class EnsembleCaptchaResponse(CaptchaResponse[list[bool]]):
+    """Grid solution voted by an ensemble, with the per-member report."""
+
+    report: EnsembleReport
@@ -5,6 +5,8 @@ from pydantic import ConfigDict
 from pydantic import computed_field
 from pydantic import field_validator
 
+from captchai.core.models.labels import LabelIndex
+
 
 def vector_from_points(
     start: tuple[float, float], end: tuple[float, float]
@@ -18,7 +20,7 @@ class GridQuadrant(BaseModel):
     y_start: float
     y_end: float
 
-    model_config = ConfigDict(arbitrary_types_allowed=True)
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
 
     @computed_field
     @property
@@ -41,6 +43,26 @@ class GridQuadrant(BaseModel):
     def middle_point_coordinates(self) -> tuple[float, float]:
         return (self.x_start + self.x_end) / 2, (self.y_start + self.y_end) / 2
 
+    @computed_field
+    @property
+    def area(self) -> float:
+        return abs(self.x_end - self.x_start) * abs(self.y_end - self.y_start)
+
+    def intersection_area(self, other: "GridQuadrant") -> float:
+        """Returns the area shared by this quadrant and another one."""
+        width = min(self.x_end, other.x_end) - max(self.x_start, other.x_start)
+        height = min(self.y_end, other.y_end) - max(self.y_start, other.y_start)
+        return max(width, 0.0) * max(height, 0.0)
+
+    def fraction_inside(self, other: "GridQuadrant") -> float:
+        """Returns the fraction of ``other`` that lies within this quadrant.
+
+        A degenerate ``other`` (zero area) is treated as a point at its middle.
+        """
+        if other.area == 0:
+            return float(self.is_point_inside(*other.middle_point_coordinates))
+        return self.intersection_area(other) / other.area
+
     def is_point_inside(self, x: float, y: float) -> bool:
         """Check if a point is inside the quadrant.
 
@@ -64,6 +86,18 @@ class GridQuadrant(BaseModel):
         )
 
 
+# Confidence given to a cell whose label only partially matches the query, for
+# example "hats" for "hat" or "bucket lid" for "bucket".
+PARTIAL_LABEL_MATCH_CONFIDENCE = 0.5
+
+# Confidence of a cell by how LabelIndex.classify relates its label to the query,
+# 1.0 otherwise
+LABEL_KIND_CONFIDENCE = {
+    "empty": 0.0,
+    "near_miss": PARTIAL_LABEL_MATCH_CONFIDENCE,
+}
+
+
 class GridLLamaVisionResponse(BaseModel):
     row1: list[str]
     row2: list[str]
@@ -82,6 +116,43 @@ class GridLLamaVisionResponse(BaseModel):
             raise ValueError(f"Each row must contain exactly 3 items, got {len(v)}")
         return v
 
-    def get_flattened_matches(self, query: str) -> list[bool]:
-        """Returns a list of boolean values indicating matches with the query."""
+    def get_flattened_matches(
+        self, query: str, label_index: LabelIndex | None = None
+    ) -> list[bool]:
+        """Returns a list of boolean values indicating matches with the query.
+
+        With a ``label_index``, labels are matched through its synonyms and
+        plurals instead of a case-insensitive comparison.
+        """
+        if label_index is not None:
+            return [label_index.matches(cell, query) for cell in self.grid]
         return [cell.lower() == query.lower() for cell in self.grid]
+
+    def get_flattened_confidences(
+        self, query: str, label_index: LabelIndex | None = None
+    ) -> list[float]:
+        """Returns how much each match in ``get_flattened_matches`` can be trusted.
+
+        A label equal to the query, or clearly unrelated to it, is a confident
+        answer. A label that contains the query or is contained in it is likely a
+        near miss and gets a low confidence. Empty labels get no confidence.
+        """
+        if label_index is not None:
+            return [
+                LABEL_KIND_CONFIDENCE.get(label_index.classify(cell, query), 1.0)
+                for cell in self.grid
+            ]
+
+        query = query.strip().lower()
+        confidences = []
+        for cell in self.grid:
+            label = cell.strip().lower()
+            if not label:
+                confidences.append(0.0)
+            elif label == query:
+                confidences.append(1.0)
+            elif query in label or label in query:
+                confidences.append(PARTIAL_LABEL_MATCH_CONFIDENCE)
+            else:
+                confidences.append(1.0)
+        return confidences
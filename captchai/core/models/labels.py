@@ -0,0 +1,175 @@
+from collections import Counter
+from threading import Lock
+
+from pydantic import BaseModel
+
+
+# Labels models give for the objects of AWS image captchas, mapped to the label
+# used in queries. Plurals of both sides are added when the index is built.
+DEFAULT_LABEL_SYNONYMS: dict[str, str] = {
+    "window": "curtain",
+    "drape": "curtain",
+    "blind": "curtain",
+    "pail": "bucket",
+    "handbag": "bag",
+    "purse": "bag",
+    "backpack": "bag",
+    "cap": "hat",
+    "beanie": "hat",
+    "alarm clock": "clock",
+    "stool": "chair",
+    "armchair": "chair",
+}
+
+_PUNCTUATION = str.maketrans("", "", ".,;:!?\"'`()[]{}")
+_ARTICLES = ("a ", "an ", "the ")
+_SIBILANT_ENDINGS = ("s", "x", "z", "ch", "sh")
+_VOWELS = "aeiou"
+_MATCHING_KINDS = ("exact", "synonym", "plural")
+# Raw labels remembered by the index. Labels are free text from models, so the
+# memo is cleared rather than allowed to grow without bound.
+_MEMO_SIZE = 4096
+
+
+def pluralize(word: str) -> str:
+    if word.endswith("y") and len(word) > 1 and word[-2] not in _VOWELS:
+        return word[:-1] + "ies"
+    if word.endswith(_SIBILANT_ENDINGS):
+        return word + "es"
+    return word + "s"
+
+
+def singularize(word: str) -> str:
+    if word.endswith("ies") and len(word) > 3:
+        return word[:-3] + "y"
+    if word.endswith("es") and word[:-2].endswith(_SIBILANT_ENDINGS):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+class LabelIndexStats(BaseModel):
+    """How labels matched queries since the index was built.
+
+    Attributes:
+        exact: Labels equal to the query once normalized
+        synonym: Labels matched through a synonym
+        plural: Labels matched as the plural or singular of the query
+        mismatch: Labels that did not match the query
+        rescued: Matches that needed a synonym or plural, by ``label->query``
+        near_misses: Mismatches that contain the query or are contained in it, by
+            ``label->query``. They get a low confidence and are what cascades
+            escalate.
+    """
+
+    exact: int = 0
+    synonym: int = 0
+    plural: int = 0
+    mismatch: int = 0
+    rescued: dict[str, int] = {}
+    near_misses: dict[str, int] = {}
+
+
+class LabelIndex:
+    """Match model labels against captcha queries.
+
+    Labels and queries are normalized (case, surrounding punctuation, articles,
+    whitespace) and mapped to a canonical label, so that "Windows." matches
+    "curtain" and "hats" matches "hat". The synonym table, with the plurals of
+    every entry, is compiled once when the index is built.
+
+    An index is thread-safe and meant to be shared: ``CaptchaSolver`` builds one
+    and every resolver it creates uses it, so the statistics cover all of them.
+    """
+
+    def __init__(self, synonyms: dict[str, str] | None = None):
+        self.synonyms = dict(DEFAULT_LABEL_SYNONYMS if synonyms is None else synonyms)
+        self._table: dict[str, str] = {}
+        for alias, canonical in self.synonyms.items():
+            canonical = self.normalize(canonical)
+            for form in (self.normalize(alias), canonical):
+                self._table[form] = canonical
+                self._table[pluralize(form)] = canonical
+        self._memo: dict[str, tuple[str, str]] = {}
+        self._lock = Lock()
+        self._counts: Counter[str] = Counter()
+        self._rescued: Counter[str] = Counter()
+        self._near_misses: Counter[str] = Counter()
+
+    def __deepcopy__(self, memo):
+        # Copies of a configuration get their own index and statistics
+        return LabelIndex(self.synonyms)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Returns ``text`` lowercased, without punctuation, articles or extra
+        whitespace."""
+        text = " ".join(text.lower().translate(_PUNCTUATION).split())
+        for article in _ARTICLES:
+            if text.startswith(article):
+                return text[len(article) :]
+        return text
+
+    def _lookup(self, text: str) -> tuple[str, str]:
+        """Returns the normalized and canonical forms of ``text``."""
+        forms = self._memo.get(text)
+        if forms is None:
+            normalized = self.normalize(text)
+            canonical = self._table.get(normalized)
+            if canonical is None:
+                singular = singularize(normalized)
+                canonical = self._table.get(singular, singular)
+            forms = normalized, canonical
+            if len(self._memo) >= _MEMO_SIZE:
+                self._memo.clear()
+            self._memo[text] = forms
+        return forms
+
+    def canonical(self, text: str) -> str:
+        """Returns the canonical label of ``text``."""
+        return self._lookup(text)[1]
+
+    def classify(self, label: str, query: str) -> str:
+        """Returns how ``label`` relates to ``query``.
+
+        One of ``exact``, ``synonym``, ``plural``, ``near_miss`` (no match, but
+        one contains the other), ``mismatch`` or ``empty`` (blank label).
+        """
+        label_normalized, label_canonical = self._lookup(label)
+        query_normalized, query_canonical = self._lookup(query)
+        if not label_normalized:
+            return "empty"
+        if not query_normalized:
+            return "mismatch"
+        if label_normalized == query_normalized:
+            return "exact"
+        if label_canonical == query_canonical:
+            if singularize(label_normalized) == singularize(query_normalized):
+                return "plural"
+            return "synonym"
+        if query_canonical in label_canonical or label_canonical in query_canonical:
+            return "near_miss"
+        return "mismatch"
+
+    def matches(self, label: str, query: str) -> bool:
+        """Returns whether ``label`` names the object of ``query``, and records
+        the outcome in the statistics."""
+        kind = self.classify(label, query)
+        matched = kind in _MATCHING_KINDS
+        with self._lock:
+            self._counts[kind if matched else "mismatch"] += 1
+            if kind in ("synonym", "plural", "near_miss"):
+                pair = f"{self._lookup(label)[0]}->{self._lookup(query)[0]}"
+                counter = self._near_misses if kind == "near_miss" else self._rescued
+                counter[pair] += 1
+        return matched
+
+    def stats(self) -> LabelIndexStats:
+        """Returns the matching statistics since the index was built."""
+        with self._lock:
+            return LabelIndexStats(
+                **self._counts,
+                rescued=dict(self._rescued),
+                near_misses=dict(self._near_misses),
+            )
@@ -0,0 +1,135 @@
+import json
+import math
+
+from collections.abc import Iterable
+from collections.abc import Sequence
+from typing import Any
+
+from pydantic_core import core_schema
+
+
+class GridSolution(Sequence[bool]):
+    """Compact grid solution: one bit per cell, row by row.
+
+    Bit ``i`` of ``mask`` is set when cell ``i`` matches the query. Ensemble
+    reports store member solutions in this form. A solution can be indexed,
+    iterated and compared with a list of bools; in pydantic models it is validated
+    from a list of bools or from its compact form, and serialized as a list of
+    bools.
+    """
+
+    __slots__ = ("mask", "grid_size")
+
+    mask: int
+    grid_size: int
+
+    def __init__(self, mask: int, grid_size: int = 3):
+        if grid_size < 1:
+            raise ValueError(f"Grid size must be positive, got {grid_size}")
+        if not 0 <= mask < 1 << grid_size**2:
+            raise ValueError(f"Mask {mask} does not fit a {grid_size}x{grid_size} grid")
+        object.__setattr__(self, "mask", mask)
+        object.__setattr__(self, "grid_size", grid_size)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @classmethod
+    def from_list(
+        cls, cells: Iterable[bool], grid_size: int | None = None
+    ) -> "GridSolution":
+        """Build a solution from one boolean per cell, in row-major order.
+
+        Args:
+            cells: Whether each cell matches
+            grid_size: Rows and columns of the grid, inferred when not given
+
+        Raises:
+            ValueError: If the number of cells does not fill a square grid
+        """
+        mask = 0
+        count = 0
+        for count, cell in enumerate(cells, start=1):
+            if cell:
+                mask |= 1 << (count - 1)
+        if grid_size is None:
+            grid_size = math.isqrt(count)
+        if grid_size**2 != count:
+            raise ValueError(f"{count} cells do not fill a square grid")
+        return cls(mask, grid_size)
+
+    def to_list(self) -> list[bool]:
+        """Returns one boolean per cell, in row-major order."""
+        mask = self.mask
+        return [bool(mask >> index & 1) for index in range(self.grid_size**2)]
+
+    @classmethod
+    def from_json(cls, data: str | bytes | dict) -> "GridSolution":
+        """Build a solution from the output of ``to_json``, or its parsed dict."""
+        if not isinstance(data, dict):
+            data = json.loads(data)
+        return cls(data["mask"], data["grid_size"])
+
+    def to_json(self) -> str:
+        """Returns the compact JSON form, ``{"mask": ..., "grid_size": ...}``."""
+        return f'{{"mask":{self.mask},"grid_size":{self.grid_size}}}'
+
+    @property
+    def match_count(self) -> int:
+        """Number of matching cells."""
+        return self.mask.bit_count()
+
+    def __len__(self) -> int:
+        return self.grid_size**2
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_list()[index]
+        cells = self.grid_size**2
+        if index < 0:
+            index += cells
+        if not 0 <= index < cells:
+            raise IndexError("GridSolution index out of range")
+        return bool(self.mask >> index & 1)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, GridSolution):
+            return (self.mask, self.grid_size) == (other.mask, other.grid_size)
+        if isinstance(other, (list, tuple)):
+            return self.to_list() == list(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.mask, self.grid_size))
+
+    def __repr__(self) -> str:
+        return f"GridSolution(mask={self.mask}, grid_size={self.grid_size})"
+
+    @classmethod
+    def _validate(cls, value: Any) -> "GridSolution":
+        if isinstance(value, GridSolution):
+            return value
+        if isinstance(value, dict):
+            return cls.from_json(value)
+        if isinstance(value, (list, tuple)):
+            if not all(isinstance(cell, bool) for cell in value):
+                raise ValueError("A grid solution must be a list of booleans")
+            return cls.from_list(value)
+        raise ValueError(f"Cannot build a GridSolution from {type(value).__name__}")
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler):
+        return core_schema.no_info_plain_validator_function(
+            cls._validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(cls.to_list),
+        )
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, schema, handler):
+        return {"type": "array", "items": {"type": "boolean"}}
@@ -1,5 +1,17 @@
+import asyncio
+
+from threading import Lock
+from time import perf_counter
+
+from captchai.core.models.cascade import CascadeCaptchaResponse
 from captchai.core.models.config import AvailableResolvers
 from captchai.core.models.config import CaptchaGlobalConfig
+from captchai.core.models.config import ResolverName
+from captchai.core.models.config import to_resolver_name
+from captchai.core.models.ensemble import EnsembleCaptchaResponse
+from captchai.core.models.ensemble import EnsembleMemberReport
+from captchai.core.models.ensemble import EnsembleReport
+from captchai.core.models.solution import GridSolution
 from captchai.core.provider.aws.resolvers import AWSAudioResolverGroqBackend
 from captchai.core.provider.aws.resolvers import AWSImageResolverMultiShootGroqBackend
 from captchai.core.provider.aws.resolvers import (
@@ -9,9 +21,13 @@ from captchai.core.provider.aws.resolvers import AWSImageResolverOneShootGroqBac
 from captchai.core.provider.aws.resolvers import (
     AWSImageResolverOneShootMoonDreamBackend,
 )
+from captchai.core.provider.base.base import AbstractResolver
+from captchai.core.provider.base.base import ResolverCapabilities
+from captchai.core.provider.base.scheduler import SCHEDULER
+from captchai.core.provider.base.scheduler import run_sync
 
 
-RESOLVERS = {
+RESOLVERS: dict[ResolverName, type[AbstractResolver]] = {
     AvailableResolvers.GROQ_AUDIO: AWSAudioResolverGroqBackend,
     AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT: (
         AWSImageResolverOneShootMoonDreamBackend
@@ -24,16 +40,310 @@ RESOLVERS = {
 }
 
 
-class AWSProviderCaptcha:
-    def _initialize_type(
-        self, config: CaptchaGlobalConfig, resolver: AvailableResolvers
+def register_resolver(
+    name: str, resolver: type[AbstractResolver], replace: bool = False
+) -> None:
+    """Register a resolver so it can be used by name in the configuration.
+
+    Args:
+        name: Name used to refer to the resolver, e.g. in ``default_image_resolver``
+        resolver: Resolver class, created with ``resolver(config=config)``
+        replace: Whether an existing resolver with the same name may be replaced
+
+    Raises:
+        TypeError: If ``resolver`` is not an AbstractResolver subclass
+        ValueError: If the name is already registered and ``replace`` is False
+    """
+    if not isinstance(resolver, type) or not issubclass(resolver, AbstractResolver):
+        raise TypeError(f"{resolver!r} is not an AbstractResolver subclass")
+
+    key = to_resolver_name(name)
+    if key in RESOLVERS and not replace:
+        raise ValueError(f"Resolver '{name}' is already registered")
+    RESOLVERS[key] = resolver
+
+
+def create_resolver(name: ResolverName, config: CaptchaGlobalConfig):
+    """Create the resolver registered under ``name``.
+
+    Raises:
+        ValueError: If no resolver is registered under ``name``
+    """
+    key = to_resolver_name(name)
+    if key not in RESOLVERS:
+        raise ValueError(f"Unknown resolver '{name}'")
+    return RESOLVERS[key](config=config)
+
+
+class AWSImageResolverEnsemble(AbstractResolver):
+    """Vote cell by cell across several image resolvers.
+
+    Members are queried in parallel through the shared scheduler, so they count
+    against the limits of their rate limit groups. Each one votes for every cell
+    with its configured weight; a cell is a match when the weight voting for it
+    is greater than ``quorum`` times the weight of the members that answered. As
+    soon as no pending member can change any cell, the solve returns without
+    them: members that have not started are cancelled, while members already
+    running cannot be interrupted and are abandoned. Their call still completes,
+    and is still paid for, but its answer is ignored. Members that fail abstain.
+    """
+
+    capabilities = ResolverCapabilities(supports_async=True, max_concurrency=8)
+
+    def __init__(self, config: CaptchaGlobalConfig):
+        super().__init__(config)
+        self.ensemble_config = config.aws_provider_config.image_ensemble
+        self.weights = self.ensemble_config.member_weights()
+        self.members = [
+            create_resolver(member, config) for member in self.ensemble_config.members
+        ]
+
+    async def _run_member(
+        self,
+        index: int,
+        data: str,
+        query: str,
+        workers: asyncio.Semaphore,
+        started: list[bool],
     ):
-        return RESOLVERS[resolver](config=config)
+        begin = 0.0
+
+        def on_start():
+            nonlocal begin
+            started[index] = True
+            begin = perf_counter()
+
+        async with workers:
+            try:
+                result = await SCHEDULER.solve(
+                    self.members[index], data, on_start=on_start, query=query
+                )
+                return result, None, perf_counter() - begin
+            except Exception as e:
+                return None, e, perf_counter() - begin
+
+    def _is_decided(self, yes: float, no: float, pending: float) -> bool:
+        quorum = self.ensemble_config.quorum
+        locked_true = yes > quorum * (yes + no + pending)
+        locked_false = yes + pending <= quorum * (yes + no + pending)
+        return locked_true or locked_false
+
+    def _record_member(
+        self, index: int, outcome, yes: list[float], no: list[float]
+    ) -> tuple[EnsembleMemberReport, Exception | None]:
+        """Adds the votes of a finished member and returns its report."""
+        result, error, latency = outcome
+        weight = self.weights[index]
+        resolver = self.ensemble_config.members[index]
+        if error is None and len(result.response) != len(yes):
+            error = ValueError(f"Expected {len(yes)} cells, got {len(result.response)}")
+        if error is not None:
+            report = EnsembleMemberReport(
+                resolver=resolver,
+                weight=weight,
+                status="error",
+                latency=latency,
+                error=str(error),
+            )
+            return report, error
+
+        for cell, vote in enumerate(result.response):
+            if vote:
+                yes[cell] += weight
+            else:
+                no[cell] += weight
+        report = EnsembleMemberReport(
+            resolver=resolver,
+            weight=weight,
+            status="ok",
+            latency=latency,
+            response=GridSolution.from_list(result.response),
+        )
+        return report, None
+
+    def _build_response(
+        self,
+        yes: list[float],
+        no: list[float],
+        reports: list[EnsembleMemberReport],
+        early_exit: bool,
+    ) -> EnsembleCaptchaResponse:
+        quorum = self.ensemble_config.quorum
+        cells = range(len(yes))
+        solution = [yes[cell] > quorum * (yes[cell] + no[cell]) for cell in cells]
+        cell_agreement = [
+            (yes[cell] if solution[cell] else no[cell]) / (yes[cell] + no[cell])
+            for cell in cells
+        ]
+        return EnsembleCaptchaResponse(
+            response=solution,
+            report=EnsembleReport(
+                members=reports,
+                cell_agreement=cell_agreement,
+                agreement=sum(cell_agreement) / len(yes),
+                early_exit=early_exit,
+            ),
+        )
+
+    async def solve_async(self, data: str, **kwargs) -> EnsembleCaptchaResponse:
+        if "query" not in kwargs:
+            raise ValueError("'query' parameter is required in kwargs")
+
+        query = kwargs["query"]
+        cells = self.config.aws_provider_config.grid_size**2
+        yes = [0.0] * cells
+        no = [0.0] * cells
+        pending_weight = sum(self.weights)
+        reports = [
+            EnsembleMemberReport(resolver=resolver, weight=weight, status="abandoned")
+            for resolver, weight in zip(self.ensemble_config.members, self.weights)
+        ]
+        errors: list[Exception] = []
+        early_exit = False
+
+        workers = asyncio.Semaphore(
+            self.ensemble_config.max_workers or len(self.members)
+        )
+        started = [False] * len(self.members)
+        tasks: dict[asyncio.Task, int] = {
+            asyncio.create_task(
+                self._run_member(index, data, query, workers, started)
+            ): index
+            for index in range(len(self.members))
+        }
+        pending: set[asyncio.Task] = set(tasks)
+        try:
+            while pending and not early_exit:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    index = tasks[task]
+                    pending_weight -= self.weights[index]
+                    reports[index], error = self._record_member(
+                        index, task.result(), yes, no
+                    )
+                    if error is not None:
+                        errors.append(error)
+                early_exit = bool(pending) and all(
+                    self._is_decided(yes[cell], no[cell], pending_weight)
+                    for cell in range(cells)
+                )
+        finally:
+            for task in pending:
+                task.cancel()
+                if not started[tasks[task]]:
+                    reports[tasks[task]].status = "cancelled"
+            await asyncio.gather(*pending, return_exceptions=True)
 
-    def __init__(self, config: CaptchaGlobalConfig, resolver: AvailableResolvers):
+        if not any(report.status == "ok" for report in reports):
+            raise errors[0]
+
+        return self._build_response(yes, no, reports, early_exit)
+
+    def solve(self, data: str, **kwargs) -> EnsembleCaptchaResponse:
+        return run_sync(self.solve_async(data, **kwargs))
+
+
+class AWSImageResolverCascade(AbstractResolver):
+    """Answer the grid with a cheap resolver and escalate only uncertain cells.
+
+    The first resolver solves the whole grid and reports a confidence for each
+    cell. Only the cells below the confidence threshold are sent, as individual
+    tiles, to the escalation resolver. If the first resolver fails or gives no
+    confidence, every cell is escalated.
+    """
+
+    capabilities = ResolverCapabilities(supports_async=True, max_concurrency=8)
+
+    def __init__(self, config: CaptchaGlobalConfig):
+        super().__init__(config)
+        self.cascade_config = config.aws_provider_config.image_cascade
+        self.first = create_resolver(self.cascade_config.first, config)
+        self.escalation = create_resolver(self.cascade_config.escalation, config)
+        if not SCHEDULER.capabilities_of(self.escalation).supports_tiles:
+            raise ValueError(
+                f"Resolver '{self.cascade_config.escalation}' does not support "
+                "tile calls"
+            )
+
+    def _uncertain_cells(self, result, cells: int) -> list[int]:
+        confidence = result.confidence
+        if confidence is None or len(confidence) != cells:
+            return list(range(cells))
+        threshold = self.cascade_config.confidence_threshold
+        return [cell for cell in range(cells) if confidence[cell] < threshold]
+
+    async def solve_async(self, data: str, **kwargs) -> CascadeCaptchaResponse:
+        if "query" not in kwargs:
+            raise ValueError("'query' parameter is required in kwargs")
+
+        query = kwargs["query"]
+        cells = self.config.aws_provider_config.grid_size**2
+        try:
+            result = await SCHEDULER.solve(self.first, data, query=query)
+            solution = list(result.response)
+            escalated_cells = self._uncertain_cells(result, cells)
+        except Exception:
+            solution = [False] * cells
+            escalated_cells = list(range(cells))
+
+        if escalated_cells:
+            answers = await SCHEDULER.solve_tiles(
+                self.escalation, data, query, escalated_cells
+            )
+            for cell, answer in zip(escalated_cells, answers):
+                solution[cell] = answer
+
+        return CascadeCaptchaResponse(
+            response=solution,
+            first_resolver=self.cascade_config.first,
+            escalation_resolver=self.cascade_config.escalation,
+            escalated_cells=escalated_cells,
+        )
+
+    def solve(self, data: str, **kwargs) -> CascadeCaptchaResponse:
+        return run_sync(self.solve_async(data, **kwargs))
+
+
+RESOLVERS[AvailableResolvers.ENSEMBLE_IMAGE] = AWSImageResolverEnsemble
+RESOLVERS[AvailableResolvers.CASCADE_IMAGE] = AWSImageResolverCascade
+
+
+class AWSProviderCaptcha:
+    """Solve AWS captchas with a single resolver.
+
+    The resolver, and the API clients it owns, are created on first use and
+    then shared by every call to ``solve``. A provider can therefore be shared
+    across threads; resolvers keep no per-solve state on the instance. Solves go
+    through the shared scheduler, so at most ``max_concurrency`` of them run at
+    once per rate limit group, and further callers wait in turn.
+    """
+
+    def _initialize_type(self, config: CaptchaGlobalConfig, resolver: ResolverName):
+        return create_resolver(resolver, config)
+
+    def __init__(self, config: CaptchaGlobalConfig, resolver: ResolverName):
         self._config = config
         self._resolver = resolver
+        self._resolver_instance: AbstractResolver | None = None
+        self._lock = Lock()
+
+    def _get_resolver(self) -> AbstractResolver:
+        resolver_instance = self._resolver_instance
+        if resolver_instance is None:
+            with self._lock:
+                if self._resolver_instance is None:
+                    self._resolver_instance = self._initialize_type(
+                        self._config, self._resolver
+                    )
+                resolver_instance = self._resolver_instance
+        return resolver_instance
 
     def solve(self, data: str, query: str = ""):
-        resolver = self._initialize_type(self._config, self._resolver)
-        return resolver.solve(data, query=query)
+        resolver = self._get_resolver()
+        return SCHEDULER.solve_sync(resolver, data, query=query)
+
+    def solve_batch(self, data: list[str], query: str = "") -> list:
+        resolver = self._get_resolver()
+        return SCHEDULER.solve_batch_sync(resolver, data, query=query)
@@ -1,22 +1,33 @@
 import base64
 import io
-import json
 
-from functools import cached_property
+from functools import lru_cache
 from time import sleep
 
 import moondream as md
 
 from groq import Groq
+from moondream.cloud_vl import CloudVL
+from moondream.types import EncodedImage
 from moondream.types import Region
 from PIL import Image
 from pydub import AudioSegment
 
 from captchai.core.models.config import CaptchaGlobalConfig
-from captchai.core.models.config import CaptchaResponse
+from captchai.core.models.config import CassetteMode
+from captchai.core.models.config import GridCaptchaResponse
+from captchai.core.models.config import WordsCaptchaResponse
 from captchai.core.models.grid import GridLLamaVisionResponse
 from captchai.core.models.grid import GridQuadrant
+from captchai.core.models.labels import LabelIndex
+from captchai.core.provider.aws.tiles import encode_tiles
+from captchai.core.provider.aws.tiles import image_digest
+from captchai.core.provider.aws.tiles import split_image
 from captchai.core.provider.base.base import AbstractResolver
+from captchai.core.provider.base.base import ResolverCapabilities
+from captchai.core.provider.base.base import TileResolver
+from captchai.core.provider.base.cassette import CassetteGroq
+from captchai.core.provider.base.cassette import CassetteMoondream
 
 
 class AudioTranscriptionError(Exception):
@@ -27,9 +38,74 @@ class AudioProcessingError(AudioTranscriptionError):
     """Raised when there are issues processing the audio file."""
 
 
+# Seconds to wait before each tile call of the multi-shoot resolvers
+TILE_CALL_PAUSE = 2
+
+
+def create_groq_client(config: CaptchaGlobalConfig):
+    """Returns the Groq client, recording or replaying when a cassette is set."""
+    client = Groq(api_key=config.groq_api_key)
+    if config.cassette is not None:
+        return CassetteGroq(client, config.cassette)
+    return client
+
+
+def create_moondream_client(config: CaptchaGlobalConfig):
+    """Returns the Moondream client, recording or replaying when a cassette is set."""
+    if config.cassette is None:
+        return md.vl(api_key=config.moondream_api_key)
+    if config.cassette.mode == CassetteMode.REPLAY:
+        # Only the local image encoding is used, so no API key is needed
+        return CassetteMoondream(CloudVL(), config.cassette)
+    return CassetteMoondream(md.vl(api_key=config.moondream_api_key), config.cassette)
+
+
+def rate_limit_pause(config: CaptchaGlobalConfig, seconds: float) -> None:
+    """Wait between backend calls, unless responses are replayed instantly."""
+    if config.cassette is not None and config.cassette.is_instant_replay:
+        return
+    sleep(seconds)
+
+
+@lru_cache(maxsize=32)
+def compute_grid_quadrants(
+    image_size: tuple[float, float], grid_size: int
+) -> tuple[GridQuadrant, ...]:
+    """Compute the grid cells of a captcha image.
+
+    The result only depends on its arguments, so it is computed once per
+    (image_size, grid_size) pair and shared by every resolver and thread. The
+    returned tuple must be treated as read-only.
+
+    Args:
+        image_size: Width and height of the captcha image
+        grid_size: Number of rows and columns of the grid
+
+    Returns:
+        The grid quadrants in row-major order
+    """
+    grid_width = image_size[0] // grid_size
+    grid_height = image_size[1] // grid_size
+
+    quadrants = []
+    for y in range(grid_size):
+        for x in range(grid_size):
+            quadrants.append(
+                GridQuadrant(
+                    x_start=x * grid_width,
+                    x_end=(x + 1) * grid_width,
+                    y_start=y * grid_height,
+                    y_end=(y + 1) * grid_height,
+                )
+            )
+    return tuple(quadrants)
+
+
 class AWSImageResolverOneShootGroqBackend(AbstractResolver):
     """Resolver for image captchas using the Llama 3.2 90B Vision model."""
 
+    capabilities = ResolverCapabilities(max_concurrency=4, rate_limit_group="groq")
+
     __PROMPT = """
     This image has 3 rows and 3 columns. It is a 3x3 grid. List all images inside
     in order using just one word (e.g., bed, clock, bucket, hat, bag, curtain, etc.).
@@ -39,15 +115,15 @@ class AWSImageResolverOneShootGroqBackend(AbstractResolver):
 
     def __init__(self, config: CaptchaGlobalConfig):
         super().__init__(config)
-        self.groq = Groq(api_key=config.groq_api_key)
-
-    def _extract_response(
-        self, response: str, query: str
-    ) -> CaptchaResponse[list[bool]]:
-        data = json.loads(response)
-        validated_response = GridLLamaVisionResponse(**data)
-        return CaptchaResponse[list[bool]](
-            response=validated_response.get_flattened_matches(query)
+        self.groq = create_groq_client(config)
+
+    def _extract_response(self, response: str, query: str) -> GridCaptchaResponse:
+        # The model output is validated, what is derived from it is trusted
+        validated_response = GridLLamaVisionResponse.model_validate_json(response)
+        label_index = self.config.label_index
+        return GridCaptchaResponse(
+            response=validated_response.get_flattened_matches(query, label_index),
+            confidence=validated_response.get_flattened_confidences(query, label_index),
         )
 
     def solve(self, data: str, **kwargs):
@@ -78,9 +154,14 @@ class AWSImageResolverOneShootGroqBackend(AbstractResolver):
 
 
 class AWSAudioResolverGroqBackend(AbstractResolver):
+    capabilities = ResolverCapabilities(max_concurrency=4, rate_limit_group="groq")
+
+    _MODEL = "whisper-large-v3-turbo"
+
     def __init__(self, config: CaptchaGlobalConfig):
         super().__init__(config)
-        self._groq = Groq(api_key=config.groq_api_key)
+        self.batch_config = config.aws_provider_config.audio_batch
+        self._groq = create_groq_client(config)
 
     def _parse_transcription(self, transcription: str) -> list[str]:
         """Parse the transcription to extract the two words after 'spoken by me'.
@@ -146,53 +227,190 @@ class AWSAudioResolverGroqBackend(AbstractResolver):
         finally:
             audio_buffer.close()
 
-    def solve(self, data: str, **kwargs) -> CaptchaResponse[list[str]]:
+    def solve(self, data: str, **kwargs) -> WordsCaptchaResponse:
         audio_data = base64.b64decode(data)
 
         file_data = self._prepare_flac_audio(audio_data)
 
         response = self._groq.audio.transcriptions.create(
             file=file_data,
-            model="whisper-large-v3-turbo",
+            model=self._MODEL,
             language="en",
             temperature=0,
         )
 
         words = self._parse_transcription(response.text)
-        captcha_response = CaptchaResponse(response=words)
-        return captcha_response
+        return WordsCaptchaResponse(response=words)
+
+    def _load_audio(self, audio_data: bytes) -> AudioSegment:
+        try:
+            return AudioSegment.from_file(io.BytesIO(audio_data))
+        except Exception as e:
+            raise AudioProcessingError("Failed to process audio file") from e
+
+    def _join_clips(
+        self, clips: list[AudioSegment]
+    ) -> tuple[tuple[str, bytes], list[tuple[float, float]]]:
+        """Join clips into one FLAC upload, separated by silence.
+
+        Returns:
+            The file for the Groq API and the start and end second of each clip
+            within it
+        """
+        gap = AudioSegment.silent(
+            duration=self.batch_config.gap_ms, frame_rate=clips[0].frame_rate
+        )
+        joined = AudioSegment.empty()
+        windows = []
+        for index, clip in enumerate(clips):
+            if index:
+                joined += gap
+            start = len(joined) / 1000
+            joined += clip
+            windows.append((start, len(joined) / 1000))
+
+        buffer = io.BytesIO()
+        joined.export(buffer, format="flac")
+        return ("audio.flac", buffer.getvalue()), windows
+
+    def _clips_around(
+        self, start: float, end: float, windows: list[tuple[float, float]]
+    ) -> list[int]:
+        """Returns the clips overlapping the ``start`` to ``end`` seconds.
+
+        Words are allowed to stray a quarter of the gap outside their clip.
+        Anything further out was heard in the silence between clips.
+        """
+        tolerance = self.batch_config.gap_ms / 4000
+        return [
+            index
+            for index, (clip_start, clip_end) in enumerate(windows)
+            if start <= clip_end + tolerance and end >= clip_start - tolerance
+        ]
+
+    def _split_transcription(
+        self, transcription, windows: list[tuple[float, float]]
+    ) -> list[str | None]:
+        """Split a batched transcript back into the text of each clip.
+
+        Each token of a segment is given to the clip its word was spoken in,
+        which keeps the punctuation of the segment text. This needs exactly one
+        word timestamp per token, each within a single clip. A clip touched by a
+        segment that cannot be split this way, or left without text, is
+        ambiguous.
+
+        Returns:
+            The text of each clip, None for the ambiguous ones
+        """
+        words = getattr(transcription, "words", None) or []
+        segments = getattr(transcription, "segments", None) or []
+        texts: list[list[str]] = [[] for _ in windows]
+        ambiguous: set[int] = set()
+        for segment in segments:
+            tokens = segment["text"].split()
+            owners = []
+            for word in words:
+                middle = (word["start"] + word["end"]) / 2
+                if segment["start"] <= middle < segment["end"]:
+                    owners.append(self._clips_around(middle, middle, windows))
+
+            if len(owners) != len(tokens) or any(len(clip) != 1 for clip in owners):
+                touched = self._clips_around(segment["start"], segment["end"], windows)
+                ambiguous.update(touched or range(len(windows)))
+                continue
+            for token, (owner,) in zip(tokens, owners):
+                texts[owner].append(token)
+
+        return [
+            None if index in ambiguous or not text else " ".join(text)
+            for index, text in enumerate(texts)
+        ]
+
+    def _transcribe_batch(self, clips: list[AudioSegment]) -> list[list[str] | None]:
+        """Transcribe clips with one request.
+
+        Returns:
+            The words of each clip, None where the batched transcript could not
+            be attributed
+        """
+        file_data, windows = self._join_clips(clips)
+        try:
+            transcription = self._groq.audio.transcriptions.create(
+                file=file_data,
+                model=self._MODEL,
+                language="en",
+                temperature=0,
+                response_format="verbose_json",
+                timestamp_granularities=["word", "segment"],
+            )
+        except Exception:
+            return [None] * len(clips)
+
+        answers = []
+        for text in self._split_transcription(transcription, windows):
+            try:
+                answers.append(
+                    None if text is None else self._parse_transcription(text)
+                )
+            except AudioTranscriptionError:
+                answers.append(None)
+        return answers
+
+    def solve_batch(self, data: list[str], **kwargs) -> list:
+        """Solve several audio captchas, several clips per transcription request.
+
+        Up to ``audio_batch.max_clips`` clips are joined into one upload. Clips
+        whose answer cannot be taken from the batched transcript, and clips of a
+        batch whose request failed, are solved on their own with ``solve``.
+
+        Args:
+            data: Base64 encoded strings of the audio data
+
+        Returns:
+            One response per clip, in order, or the exception that clip raised
+        """
+        results: list = [None] * len(data)
+        clips: dict[int, AudioSegment] = {}
+        for index, item in enumerate(data):
+            try:
+                clips[index] = self._load_audio(base64.b64decode(item))
+            except Exception as e:
+                results[index] = e
+
+        pending = list(clips)
+        size = self.batch_config.max_clips
+        for batch in (pending[i : i + size] for i in range(0, len(pending), size)):
+            if len(batch) < 2:
+                continue
+            answers = self._transcribe_batch([clips[index] for index in batch])
+            for index, words in zip(batch, answers):
+                if words is not None:
+                    results[index] = WordsCaptchaResponse(response=words)
+
+        for index in pending:
+            if results[index] is None:
+                try:
+                    results[index] = self.solve(data[index])
+                except Exception as e:
+                    results[index] = e
+        return results
 
 
 class AWSImageResolverOneShootMoonDreamBackend(AbstractResolver):
     """Resolver for image captchas using the MoonDream backend."""
 
+    capabilities = ResolverCapabilities(max_concurrency=4, rate_limit_group="moondream")
+
     def __init__(self, config: CaptchaGlobalConfig):
         super().__init__(config)
         self.image_size = config.aws_provider_config.image_size
         self.grid_size = config.aws_provider_config.grid_size
-        self.model = md.vl(api_key=config.moondream_api_key)
-
-    @cached_property
-    def _get_grid_quadrants(self) -> list[GridQuadrant]:
-        """Returns a list of GridQuadrants for the given image."""
-        grid_size = self.grid_size
-        image_size = self.image_size
-
-        grid_width = image_size[0] // grid_size
-        grid_height = image_size[1] // grid_size
-
-        quadrants = []
-        for y in range(grid_size):
-            for x in range(grid_size):
-                quadrants.append(
-                    GridQuadrant(
-                        x_start=x * grid_width,
-                        x_end=(x + 1) * grid_width,
-                        y_start=y * grid_height,
-                        y_end=(y + 1) * grid_height,
-                    )
-                )
-        return quadrants
+        self.model = create_moondream_client(config)
+
+    @property
+    def _get_grid_quadrants(self) -> tuple[GridQuadrant, ...]:
+        """Returns the GridQuadrants for the configured image and grid size."""
+        return compute_grid_quadrants(tuple(self.image_size), self.grid_size)
 
     def _get_quadrants_of_objects(self, objects: list[Region]) -> list[GridQuadrant]:
         quadrants_of_objects = []
@@ -210,8 +428,8 @@ class AWSImageResolverOneShootMoonDreamBackend(AbstractResolver):
     def _compute_solution_flatten_list(
         self, quadrants_of_objects: list[GridQuadrant]
     ) -> list[bool]:
-        solutions = [False] * self.config.aws_provider_config.grid_size**2
-        image_quadrants: list[GridQuadrant] = self._get_grid_quadrants
+        solutions = [False] * self.grid_size**2
+        image_quadrants = self._get_grid_quadrants
         for object_quadrant_index, object_quadrant in enumerate(quadrants_of_objects):
             for quadrant_index, quadrant in enumerate(image_quadrants):
                 inside = quadrant.is_point_inside(
@@ -223,74 +441,135 @@ class AWSImageResolverOneShootMoonDreamBackend(AbstractResolver):
                     break
         return solutions
 
-    def _extract_solution(self, query, loaded_image):
-        detected_output = self.model.detect(loaded_image, query)
+    def _compute_confidences(
+        self, quadrants_of_objects: list[GridQuadrant], solution: list[bool]
+    ) -> list[float]:
+        """Estimate how reliable each cell of ``solution`` is from box overlap.
+
+        A matched cell is as reliable as the share of its detected object that
+        falls inside it. An unmatched cell loses confidence when a detected object
+        spills into it without having its middle point there.
+        """
+        confidences = []
+        for quadrant_index, quadrant in enumerate(self._get_grid_quadrants):
+            owned, spilled = [0.0], [0.0]
+            for object_quadrant in quadrants_of_objects:
+                fraction = quadrant.fraction_inside(object_quadrant)
+                middle_point = object_quadrant.middle_point_coordinates
+                if quadrant.is_point_inside(*middle_point):
+                    owned.append(fraction)
+                else:
+                    spilled.append(fraction)
+            if solution[quadrant_index]:
+                confidences.append(max(owned))
+            else:
+                confidences.append(1.0 - max(spilled))
+        return confidences
+
+    def _encode_image(self, data: str) -> EncodedImage:
+        return self.config.encoding_cache.get_or_encode(
+            image_digest(data),
+            "image",
+            lambda: self.model.encode_image(
+                Image.open(io.BytesIO(base64.b64decode(data)))
+            ),
+        )
+
+    def _extract_solution(self, query, encoded_image: EncodedImage):
+        detected_output = self.model.detect(encoded_image, query)
         quadrants_of_objects = self._get_quadrants_of_objects(
             detected_output["objects"]
         )
 
         solution = self._compute_solution_flatten_list(quadrants_of_objects)
-        return solution
+        confidences = self._compute_confidences(quadrants_of_objects, solution)
+        return solution, confidences
 
     def solve(self, data: str, **kwargs):
         if "query" not in kwargs:
             raise ValueError("'query' parameter is required in kwargs")
 
         query = kwargs["query"]
-        loaded_image = Image.open(io.BytesIO(base64.b64decode(data)))
-        solution = self._extract_solution(query, loaded_image)
-        return CaptchaResponse[list[bool]](response=solution)
+        solution, confidences = self._extract_solution(query, self._encode_image(data))
+        return GridCaptchaResponse(response=solution, confidence=confidences)
 
 
-class AWSImageResolverMultiShootMoonDreamBackend(AbstractResolver):
+class AWSImageResolverMultiShootMoonDreamBackend(TileResolver):
+    capabilities = ResolverCapabilities(
+        max_concurrency=4,
+        batch_size=9,
+        rate_limit_group="moondream",
+        supports_tiles=True,
+    )
+
     def __init__(self, config: CaptchaGlobalConfig):
         super().__init__(config)
         self.grid_size = config.aws_provider_config.grid_size
         self.image_size = config.aws_provider_config.image_size
-        self.model = md.vl(api_key=config.moondream_api_key)
+        self.model = create_moondream_client(config)
 
     def solve(self, data: str, **kwargs):
         if "query" not in kwargs:
             raise ValueError("'query' parameter is required in kwargs")
 
         query = kwargs["query"]
-        loaded_image = Image.open(io.BytesIO(base64.b64decode(data)))
-        solution = self._extract_solution(query, loaded_image)
-        return CaptchaResponse[list[bool]](response=solution)
+        indices = list(range(self.grid_size**2))
+        solution = self._extract_solution(query, self._encode_tiles(data, indices))
+        return GridCaptchaResponse(response=solution)
+
+    def solve_tiles(self, data: str, query: str, indices: list[int]) -> list[bool]:
+        """Solve only the given cells of the grid, one tile call per cell.
+
+        Args:
+            data: Base64 encoded string of the image data
+            query: The type of object to look for in the image
+            indices: Row-major indices of the cells to solve
+
+        Returns:
+            The answer for each requested cell, in the order of ``indices``
+        """
+        return self._extract_solution(query, self._encode_tiles(data, indices))
+
+    def _encode_tiles(self, data: str, indices: list[int]) -> list[EncodedImage]:
+        """Returns the encoded tiles at ``indices``, reusing cached encodings.
+
+        The image is only decoded and split when a tile is missing from the cache.
+        """
+        challenge = image_digest(data)
+        parts = [(tuple(self.image_size), self.grid_size, index) for index in indices]
+        encoded = [self.config.encoding_cache.get(challenge, part) for part in parts]
+        missing = [position for position, tile in enumerate(encoded) if tile is None]
+        if missing:
+            tiles = self._split_image(Image.open(io.BytesIO(base64.b64decode(data))))
+            for position in missing:
+                encoded[position] = self.model.encode_image(tiles[indices[position]])
+                self.config.encoding_cache.put(
+                    challenge, parts[position], encoded[position]
+                )
+        return encoded
 
-    def _extract_solution(self, query, loaded_image):
+    def _extract_solution(self, query, encoded_tiles: list[EncodedImage]):
         solution = []
-        splitted_image = self._split_image(loaded_image)
-        for image in splitted_image:
-            sleep(2)
+        for image in encoded_tiles:
+            rate_limit_pause(self.config, TILE_CALL_PAUSE)
             result = self.model.query(
                 image, f"is this a {query}? answer only in yes or no"
             )
-            if result["answer"].strip().lower() == "yes":
+            if LabelIndex.normalize(result["answer"]) == "yes":
                 solution.append(True)
             else:
                 solution.append(False)
         return solution
 
     def _split_image(self, loaded_image: Image.Image) -> list[Image.Image]:
-        grid_width = self.image_size[0] // self.grid_size
-        grid_height = self.image_size[1] // self.grid_size
-
-        split_images = []
-        for y in range(self.grid_size):
-            for x in range(self.grid_size):
-                x_start = x * grid_width
-                x_end = (x + 1) * grid_width
-                y_start = y * grid_height
-                y_end = (y + 1) * grid_height
+        return split_image(loaded_image, self.image_size, self.grid_size)
 
-                cropped_image = loaded_image.crop((x_start, y_start, x_end, y_end))
-                split_images.append(cropped_image)
 
-        return split_images
+class AWSImageResolverMultiShootGroqBackend(TileResolver):
+    capabilities = ResolverCapabilities(
+        max_concurrency=4, batch_size=9, rate_limit_group="groq", supports_tiles=True
+    )
 
-
-class AWSImageResolverMultiShootGroqBackend(AbstractResolver):
     __PROMPT = """
     Choose the type of object you see. The preferred options are: chair, hat,
     bag, bed, bucket or curtain. If you strongly believe it is something else,
@@ -302,36 +581,21 @@ class AWSImageResolverMultiShootGroqBackend(AbstractResolver):
         super().__init__(config)
         self.grid_size = config.aws_provider_config.grid_size
         self.image_size = config.aws_provider_config.image_size
-        self.groq = Groq(api_key=config.groq_api_key)
+        self.quality = config.aws_provider_config.tile_encoding_quality
+        self.encoding_workers = config.aws_provider_config.tile_encoding_workers
+        self.groq = create_groq_client(config)
 
     def _split_image(self, loaded_image: Image.Image) -> list[Image.Image]:
-        grid_width = self.image_size[0] // self.grid_size
-        grid_height = self.image_size[1] // self.grid_size
-
-        split_images = []
-        for y in range(self.grid_size):
-            for x in range(self.grid_size):
-                x_start = x * grid_width
-                x_end = (x + 1) * grid_width
-                y_start = y * grid_height
-                y_end = (y + 1) * grid_height
-
-                cropped_image = loaded_image.crop((x_start, y_start, x_end, y_end))
-                split_images.append(cropped_image)
+        return split_image(loaded_image, self.image_size, self.grid_size)
 
-        return split_images
-
-    def _extract_solution(self, query, loaded_image) -> list[bool]:
+    def _extract_solution(self, query, loaded_image, indices=None) -> list[bool]:
         solution = []
-        split_image = self._split_image(loaded_image)
-        for idx, image in enumerate(split_image):
-            # Save each split image for debugging
-            # image.save(os.path.join(debug_dir, f"split_image_{idx}.png"))
-
-            buffer = io.BytesIO()
-            image.convert("RGB").save(buffer, format="JPEG")
-            data = base64.b64encode(buffer.getvalue()).decode("utf-8")
-            sleep(2)
+        split_images = self._split_image(loaded_image)
+        if indices is not None:
+            split_images = [split_images[index] for index in indices]
+        encoded_tiles = encode_tiles(split_images, self.encoding_workers, self.quality)
+        for data in encoded_tiles:
+            rate_limit_pause(self.config, TILE_CALL_PAUSE)
             result = self.groq.chat.completions.create(
                 model="llama-3.2-90b-vision-preview",
                 messages=[
@@ -348,13 +612,11 @@ class AWSImageResolverMultiShootGroqBackend(AbstractResolver):
                 ],
                 temperature=0,
             )
-            if (
-                result.choices[0].message.content.strip().lower().replace(".", "")
-                == query
-            ):
-                solution.append(True)
-            else:
-                solution.append(False)
+            solution.append(
+                self.config.label_index.matches(
+                    result.choices[0].message.content, query
+                )
+            )
         return solution
 
     def solve(self, data: str, **kwargs):
@@ -364,4 +626,18 @@ class AWSImageResolverMultiShootGroqBackend(AbstractResolver):
         query = kwargs["query"]
         loaded_image = Image.open(io.BytesIO(base64.b64decode(data)))
         solution = self._extract_solution(query, loaded_image)
-        return CaptchaResponse[list[bool]](response=solution)
+        return GridCaptchaResponse(response=solution)
+
+    def solve_tiles(self, data: str, query: str, indices: list[int]) -> list[bool]:
+        """Solve only the given cells of the grid, one tile call per cell.
+
+        Args:
+            data: Base64 encoded string of the image data
+            query: The type of object to look for in the image
+            indices: Row-major indices of the cells to solve
+
+        Returns:
+            The answer for each requested cell, in the order of ``indices``
+        """
+        loaded_image = Image.open(io.BytesIO(base64.b64decode(data)))
+        return self._extract_solution(query, loaded_image, indices)
@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import io
+import math
+import os
+
+from collections import OrderedDict
+from collections.abc import Callable
+from collections.abc import Hashable
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any
+
+from PIL import Image
+
+
+def split_image(
+    image: Image.Image, image_size: tuple[float, float], grid_size: int
+) -> list[Image.Image]:
+    """Split an image into grid tiles.
+
+    Cells are laid out as in ``compute_grid_quadrants``, row by row.
+
+    Args:
+        image: Decoded captcha image
+        image_size: Width and height the grid is computed for
+        grid_size: Number of rows and columns of the grid
+
+    Returns:
+        The tiles in row-major order
+    """
+    grid_width = image_size[0] // grid_size
+    grid_height = image_size[1] // grid_size
+
+    tiles = []
+    for y in range(grid_size):
+        for x in range(grid_size):
+            tiles.append(
+                image.crop(
+                    (
+                        x * grid_width,
+                        y * grid_height,
+                        (x + 1) * grid_width,
+                        (y + 1) * grid_height,
+                    )
+                )
+            )
+    return tiles
+
+
+def encode_tile(tile: Image.Image, quality: int = 75) -> str:
+    """Returns a tile as a base64 encoded JPEG."""
+    if tile.mode != "RGB":
+        tile = tile.convert("RGB")
+    buffer = io.BytesIO()
+    tile.save(buffer, format="JPEG", quality=quality)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+_encoder: ThreadPoolExecutor | None = None
+_encoder_lock = Lock()
+
+
+def tile_encoder() -> ThreadPoolExecutor:
+    """Returns the thread pool encoding tiles, shared by every resolver.
+
+    It is created on first use, with one thread per CPU, and lives as long as
+    the process, so resolvers do not own threads they would have to release.
+    """
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1, thread_name_prefix="captchai-tiles"
+            )
+        return _encoder
+
+
+def encode_tiles(
+    tiles: list[Image.Image], workers: int = 1, quality: int = 75
+) -> list[str]:
+    """Encode several tiles as base64 JPEGs, in parallel when ``workers`` > 1.
+
+    PIL releases the GIL while encoding, so the tiles are split into up to
+    ``workers`` runs encoded concurrently on the shared ``tile_encoder`` pool.
+    On a single core the pool would only add overhead, so tiles are then
+    encoded in the calling thread.
+    """
+    workers = min(workers, len(tiles), os.cpu_count() or 1)
+    if workers < 2:
+        return [encode_tile(tile, quality) for tile in tiles]
+
+    size = math.ceil(len(tiles) / workers)
+    runs = [tiles[start : start + size] for start in range(0, len(tiles), size)]
+    encoded = tile_encoder().map(
+        lambda run: [encode_tile(tile, quality) for tile in run], runs
+    )
+    return [tile for run in encoded for tile in run]
+
+
+def image_digest(data: str) -> str:
+    """Returns a short digest identifying the base64 encoded image ``data``."""
+    return hashlib.blake2b(data.encode("ascii"), digest_size=16).hexdigest()
+
+
+class EncodingCache:
+    """Bounded, thread-safe cache of image encodings, grouped by challenge.
+
+    Each challenge (identified by the digest of its image) holds the encodings
+    of the whole image and of its tiles. Only the ``max_challenges`` most
+    recently used challenges are kept.
+    """
+
+    def __init__(self, max_challenges: int = 8):
+        self.max_challenges = max_challenges
+        self._challenges: OrderedDict[str, dict[Hashable, Any]] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __deepcopy__(self, memo):
+        # Copies of a configuration get their own, empty cache
+        return EncodingCache(self.max_challenges)
+
+    def get(self, challenge: str, part: Hashable) -> Any | None:
+        """Returns the cached encoding of ``part`` of ``challenge``, if any."""
+        with self._lock:
+            encodings = self._challenges.get(challenge)
+            if encodings is None or part not in encodings:
+                self.misses += 1
+                return None
+            self._challenges.move_to_end(challenge)
+            self.hits += 1
+            return encodings[part]
+
+    def put(self, challenge: str, part: Hashable, encoding: Any) -> None:
+        with self._lock:
+            self._challenges.setdefault(challenge, {})[part] = encoding
+            self._challenges.move_to_end(challenge)
+            while len(self._challenges) > self.max_challenges:
+                self._challenges.popitem(last=False)
+
+    def get_or_encode(
+        self, challenge: str, part: Hashable, encode: Callable[[], Any]
+    ) -> Any:
+        """Returns the cached encoding of ``part``, encoding it on a miss.
+
+        Encoding runs outside the lock, so two threads missing the same part at
+        once both encode it and the last one wins.
+        """
+        encoding = self.get(challenge, part)
+        if encoding is None:
+            encoding = encode()
+            self.put(challenge, part, encoding)
+        return encoding
+
+    def clear(self) -> None:
+        with self._lock:
+            self._challenges.clear()
+            self.hits = 0
+            self.misses = 0
@@ -1,11 +1,84 @@
+import asyncio
+
 from abc import abstractmethod
+from typing import ClassVar
+
+from pydantic import BaseModel
+from pydantic import ConfigDict
+from pydantic import Field
 
 from captchai.core.models.config import CaptchaGlobalConfig
 
 
+class ResolverCapabilities(BaseModel):
+    """How a resolver prefers to be driven by a scheduler.
+
+    Attributes:
+        supports_async: ``solve_async`` is native and does not block a thread
+        max_concurrency: Maximum calls in flight for the rate limit group
+        batch_size: Maximum number of tiles handled by one ``solve_tiles`` call
+        rate_limit_group: Resolvers sharing a group share ``max_concurrency``
+        supports_tiles: The resolver is a ``TileResolver``
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    supports_async: bool = False
+    max_concurrency: int = Field(default=1, ge=1)
+    batch_size: int = Field(default=1, ge=1)
+    rate_limit_group: str | None = None
+    supports_tiles: bool = False
+
+
 class AbstractResolver:
+    capabilities: ClassVar[ResolverCapabilities] = ResolverCapabilities()
+
     def __init__(self, config: CaptchaGlobalConfig):
         self.config = config
 
     @abstractmethod
     def solve(self, data: str, **kwargs): ...
+
+    def solve_batch(self, data: list[str], **kwargs) -> list:
+        """Solve several captchas, one result or exception per captcha.
+
+        Calls ``solve`` for each captcha by default. Resolvers whose backend can
+        answer several captchas per request override it.
+        """
+        results = []
+        for item in data:
+            try:
+                results.append(self.solve(item, **kwargs))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def solve_async(self, data: str, **kwargs):
+        """Async version of ``solve``. Runs ``solve`` in a thread by default."""
+        return await asyncio.to_thread(self.solve, data, **kwargs)
+
+
+class TileResolver(AbstractResolver):
+    """Resolver that can also answer individual cells of the grid.
+
+    Schedulers and cascades check ``capabilities.supports_tiles`` before making
+    tile calls, so subclasses that override ``capabilities`` must keep it set.
+    """
+
+    capabilities: ClassVar[ResolverCapabilities] = ResolverCapabilities(
+        supports_tiles=True
+    )
+
+    @abstractmethod
+    def solve_tiles(self, data: str, query: str, indices: list[int]) -> list[bool]:
+        """Solve only the given cells of the grid.
+
+        Returns:
+            The answer for each requested cell, in the order of ``indices``
+        """
+
+    async def solve_tiles_async(
+        self, data: str, query: str, indices: list[int]
+    ) -> list[bool]:
+        """Async version of ``solve_tiles``. Runs it in a thread by default."""
+        return await asyncio.to_thread(self.solve_tiles, data, query, indices)
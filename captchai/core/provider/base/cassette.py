@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from time import sleep
+from typing import Any
+
+from groq.types.audio import Transcription
+from groq.types.chat import ChatCompletion
+from PIL import Image
+
+from captchai.core.models.config import CassetteConfig
+from captchai.core.models.config import CassetteMode
+
+
+CASSETTE_VERSION = 1
+
+
+class CassetteError(Exception):
+    """Base exception for record/replay related errors."""
+
+
+class CassetteMissError(CassetteError):
+    """Raised in replay mode when no recorded response matches a call."""
+
+
+def _hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _canonicalize(value: Any) -> Any:
+    """Make a call argument JSON serializable, replacing payloads by their hash."""
+    if isinstance(value, (bytes, bytearray)):
+        return {"sha256": _hash_bytes(bytes(value))}
+    if isinstance(value, str) and value.startswith("data:"):
+        return {"sha256": _hash_bytes(value.encode("utf-8"))}
+    if isinstance(value, Image.Image):
+        return {
+            "sha256": _hash_bytes(value.tobytes()),
+            "mode": value.mode,
+            "size": list(value.size),
+        }
+    if isinstance(value, dict):
+        return {str(key): _canonicalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonicalize(item) for item in value]
+    if hasattr(value, "image_url"):
+        # moondream's Base64EncodedImage
+        return _canonicalize(value.image_url)
+    return value
+
+
+def interaction_key(endpoint: str, **arguments) -> str:
+    """Returns the cassette key of a call.
+
+    Payloads (images, audio) are keyed by hash and every other argument, the
+    prompt included, is keyed by value, so editing a prompt invalidates the
+    recorded responses made with it.
+    """
+    canonical = json.dumps(
+        {"endpoint": endpoint, "arguments": _canonicalize(arguments)},
+        sort_keys=True,
+    )
+    return _hash_bytes(canonical.encode("utf-8"))
+
+
+class Cassette:
+    """Recorded backend responses stored in a JSON file.
+
+    Cassettes are shared per path, so every client recording to the same file
+    writes through the same instance.
+    """
+
+    _open: dict[Path, "Cassette"] = {}
+    _open_lock = Lock()
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = Lock()
+        self._interactions: dict[str, dict] = {}
+        if path.exists():
+            data = json.loads(path.read_text())
+            if data.get("version") != CASSETTE_VERSION:
+                raise CassetteError(
+                    f"Unsupported cassette version {data.get('version')} in {path}"
+                )
+            self._interactions = data["interactions"]
+
+    @classmethod
+    def open(cls, path: str | os.PathLike) -> "Cassette":
+        resolved = Path(path).resolve()
+        with cls._open_lock:
+            if resolved not in cls._open:
+                cls._open[resolved] = cls(resolved)
+            return cls._open[resolved]
+
+    def __len__(self) -> int:
+        return len(self._interactions)
+
+    def get(self, key: str) -> dict:
+        with self._lock:
+            if key not in self._interactions:
+                raise CassetteMissError(
+                    f"No recorded response for {key} in {self.path}"
+                )
+            return self._interactions[key]
+
+    def put(self, key: str, endpoint: str, response: Any, latency: float) -> None:
+        with self._lock:
+            self._interactions[key] = {
+                "endpoint": endpoint,
+                "response": response,
+                "latency": latency,
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = self.path.with_suffix(".tmp")
+            temporary_path.write_text(
+                json.dumps(
+                    {"version": CASSETTE_VERSION, "interactions": self._interactions},
+                    indent=2,
+                    sort_keys=True,
+                )
+            )
+            temporary_path.replace(self.path)
+
+
+class _CassetteEndpoint:
+    """Record or replay a single client method."""
+
+    def __init__(
+        self, cassette: Cassette, config: CassetteConfig, endpoint: str, call, parse
+    ):
+        self._cassette = cassette
+        self._config = config
+        self._endpoint = endpoint
+        self._call = call
+        self._parse = parse
+
+    def __call__(self, *args, **kwargs):
+        key = interaction_key(self._endpoint, args=args, kwargs=kwargs)
+
+        if self._config.mode == CassetteMode.REPLAY:
+            interaction = self._cassette.get(key)
+            if self._config.replay_latency:
+                sleep(interaction["latency"])
+            return self._parse(interaction["response"])
+
+        started = perf_counter()
+        response = self._call(*args, **kwargs)
+        latency = perf_counter() - started
+        if hasattr(response, "model_dump"):
+            serialized = response.model_dump(mode="json")
+        else:
+            serialized = response
+        self._cassette.put(key, self._endpoint, serialized, latency)
+        return self._parse(serialized)
+
+
+class _Namespace:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class CassetteGroq:
+    """Groq client replacement recording to or replaying from a cassette.
+
+    Only the endpoints used by the resolvers are available.
+    """
+
+    def __init__(self, client, config: CassetteConfig):
+        cassette = Cassette.open(config.path)
+        completions = _CassetteEndpoint(
+            cassette,
+            config,
+            "groq.chat.completions.create",
+            lambda *args, **kwargs: client.chat.completions.create(*args, **kwargs),
+            ChatCompletion.model_validate,
+        )
+        transcriptions = _CassetteEndpoint(
+            cassette,
+            config,
+            "groq.audio.transcriptions.create",
+            lambda *args, **kwargs: client.audio.transcriptions.create(*args, **kwargs),
+            Transcription.model_validate,
+        )
+        self.chat = _Namespace(completions=_Namespace(create=completions))
+        self.audio = _Namespace(transcriptions=_Namespace(create=transcriptions))
+
+
+class CassetteMoondream:
+    """Moondream client replacement recording to or replaying from a cassette.
+
+    Image encoding is local and always delegated to the real client.
+    """
+
+    def __init__(self, model, config: CassetteConfig):
+        cassette = Cassette.open(config.path)
+        self._model = model
+        self._detect = _CassetteEndpoint(
+            cassette, config, "moondream.detect", model.detect, dict
+        )
+        self._query = _CassetteEndpoint(
+            cassette, config, "moondream.query", model.query, dict
+        )
+
+    def encode_image(self, image):
+        return self._model.encode_image(image)
+
+    def detect(self, image, *args, **kwargs):
+        # Key on the encoded image, whether the caller passes it encoded or not
+        return self._detect(self.encode_image(image), *args, **kwargs)
+
+    def query(self, image, *args, **kwargs):
+        return self._query(self.encode_image(image), *args, **kwargs)
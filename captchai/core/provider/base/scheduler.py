@@ -0,0 +1,271 @@
+import asyncio
+
+from collections import deque
+from collections.abc import Callable
+from collections.abc import Coroutine
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from threading import Lock
+from typing import Any
+
+from captchai.core.provider.base.base import AbstractResolver
+from captchai.core.provider.base.base import ResolverCapabilities
+
+
+def run_sync(coroutine: Coroutine[Any, Any, Any]):
+    """Run a coroutine to completion from synchronous code.
+
+    When the calling thread is already running an event loop, as when the sync
+    API is used from async code, the coroutine runs on a new loop in a dedicated
+    thread instead. The caller's loop is blocked until it completes, like with
+    any other synchronous call.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+class GroupLimit:
+    """First come, first served limit on the calls in flight for a group.
+
+    Callers may wait in threads or in coroutines on any event loop. A released
+    slot is handed directly to the caller that has waited the longest, so no
+    caller can be overtaken indefinitely under contention.
+    """
+
+    def __init__(self, size: int):
+        self._lock = Lock()
+        self._free = size
+        # Callables handing a slot to a waiter, returning whether it was taken
+        self._waiters: deque[Callable[[], bool]] = deque()
+
+    def _take(self) -> bool:
+        if self._free and not self._waiters:
+            self._free -= 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        """Wait in the calling thread for a slot."""
+        granted = Event()
+
+        def grant() -> bool:
+            granted.set()
+            return True
+
+        with self._lock:
+            if self._take():
+                return
+            self._waiters.append(grant)
+        granted.wait()
+
+    async def acquire_async(self) -> None:
+        """Wait in the running event loop for a slot."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def set_granted():
+            if not granted.done():
+                granted.set_result(None)
+
+        def grant() -> bool:
+            try:
+                loop.call_soon_threadsafe(set_granted)
+            except RuntimeError:
+                # The loop of the waiter is closed, the slot goes to the next one
+                return False
+            return True
+
+        with self._lock:
+            if self._take():
+                return
+            self._waiters.append(grant)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            with self._lock:
+                waiting = grant in self._waiters
+                if waiting:
+                    self._waiters.remove(grant)
+            if not waiting:
+                # The slot was handed over while the waiter was being cancelled
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                if self._waiters.popleft()():
+                    return
+            self._free += 1
+
+
+class ResolverScheduler:
+    """Drive resolvers according to their declared capabilities.
+
+    Calls are limited per rate limit group to the group's ``max_concurrency``,
+    tile requests are split into batches of ``batch_size`` and run in parallel,
+    and resolvers without native async support are run in the scheduler's
+    threads.
+
+    The limits are thread-safe, first come first served and not bound to an
+    event loop. A single scheduler, ``SCHEDULER``, is shared by the whole
+    process: providers call ``solve_sync`` for every solve, and ensembles and
+    cascades drive their members through it, so the limits hold across every
+    solve, thread and event loop. Blocking calls made from async code run in
+    the scheduler's own thread pool rather than the loop's default executor, so
+    a call abandoned by its caller never holds up the loop that started it.
+    """
+
+    def __init__(self, max_threads: int = 32):
+        self._limits: dict[str | type, GroupLimit] = {}
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_threads, thread_name_prefix="captchai-scheduler"
+        )
+
+    def _limit(self, resolver: AbstractResolver) -> GroupLimit:
+        capabilities = self.capabilities_of(resolver)
+        group = capabilities.rate_limit_group or type(resolver)
+        with self._lock:
+            if group not in self._limits:
+                self._limits[group] = GroupLimit(capabilities.max_concurrency)
+            return self._limits[group]
+
+    @staticmethod
+    def capabilities_of(resolver: AbstractResolver) -> ResolverCapabilities:
+        """Returns the capabilities of a resolver, defaulting for plain objects."""
+        capabilities = getattr(resolver, "capabilities", None)
+        if isinstance(capabilities, ResolverCapabilities):
+            return capabilities
+        return ResolverCapabilities()
+
+    async def _call(
+        self,
+        resolver: AbstractResolver,
+        function: Callable,
+        args: tuple,
+        kwargs: dict,
+        on_start: Callable[[], None] | None = None,
+    ):
+        """Call ``function`` within a slot of the rate limit group of ``resolver``.
+
+        Native async functions are awaited. Blocking functions run in the
+        scheduler's threads and keep their slot until they return, even when
+        the caller stops waiting for them.
+        """
+        limit = self._limit(resolver)
+        await limit.acquire_async()
+        if self.capabilities_of(resolver).supports_async:
+            try:
+                if on_start is not None:
+                    on_start()
+                return await function(*args, **kwargs)
+            finally:
+                limit.release()
+
+        try:
+            if on_start is not None:
+                on_start()
+            future = self._executor.submit(function, *args, **kwargs)
+        except BaseException:
+            limit.release()
+            raise
+        future.add_done_callback(lambda _: limit.release())
+        return await asyncio.wrap_future(future)
+
+    def _call_sync(
+        self, resolver: AbstractResolver, function: Callable, *args, **kwargs
+    ):
+        limit = self._limit(resolver)
+        limit.acquire()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            limit.release()
+
+    def solve_sync(self, resolver: AbstractResolver, data: str, **kwargs):
+        """Run ``resolver.solve`` in the calling thread, within its group."""
+        return self._call_sync(resolver, resolver.solve, data, **kwargs)
+
+    def solve_batch_sync(self, resolver: AbstractResolver, data: list[str], **kwargs):
+        """Run ``resolver.solve_batch`` in the calling thread, within its group.
+
+        A batch takes a single slot: its backend calls are made one after the
+        other.
+        """
+        return self._call_sync(resolver, resolver.solve_batch, data, **kwargs)
+
+    async def solve(
+        self,
+        resolver: AbstractResolver,
+        data: str,
+        on_start: Callable[[], None] | None = None,
+        **kwargs,
+    ):
+        """Run ``resolver.solve`` within its rate limit group.
+
+        Args:
+            resolver: Resolver to run
+            data: Data passed to ``solve``
+            on_start: Called once the call has a slot, right before it starts
+            **kwargs: Keyword arguments passed to ``solve``
+        """
+        if self.capabilities_of(resolver).supports_async:
+            function = resolver.solve_async
+        else:
+            function = resolver.solve
+        return await self._call(resolver, function, (data,), kwargs, on_start)
+
+    async def solve_many(
+        self, jobs: list[tuple[AbstractResolver, str, dict]]
+    ) -> list[object]:
+        """Run several ``(resolver, data, kwargs)`` jobs concurrently.
+
+        Returns:
+            The result of each job, or the exception it raised, in job order
+        """
+        return await asyncio.gather(
+            *(self.solve(resolver, data, **kwargs) for resolver, data, kwargs in jobs),
+            return_exceptions=True,
+        )
+
+    async def _solve_batch(
+        self, resolver: AbstractResolver, data: str, query: str, batch: list[int]
+    ) -> list[bool]:
+        if self.capabilities_of(resolver).supports_async:
+            function = resolver.solve_tiles_async
+        else:
+            function = resolver.solve_tiles
+        return await self._call(resolver, function, (data, query, batch), {})
+
+    async def solve_tiles(
+        self, resolver: AbstractResolver, data: str, query: str, indices: list[int]
+    ) -> list[bool]:
+        """Solve the given cells with a tile-capable resolver.
+
+        Returns:
+            The answer for each requested cell, in the order of ``indices``
+
+        Raises:
+            ValueError: If the resolver does not support tile calls
+        """
+        capabilities = self.capabilities_of(resolver)
+        if not capabilities.supports_tiles:
+            raise ValueError(f"{type(resolver).__name__} does not support tile calls")
+
+        size = capabilities.batch_size
+        batches = [
+            indices[start : start + size] for start in range(0, len(indices), size)
+        ]
+        results = await asyncio.gather(
+            *(self._solve_batch(resolver, data, query, batch) for batch in batches)
+        )
+        return [answer for batch_result in results for answer in batch_result]
+
+
+# Shared by every resolver of the process, so that rate limits hold across solves
+SCHEDULER = ResolverScheduler()
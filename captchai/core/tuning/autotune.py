@@ -0,0 +1,465 @@
+"""Sweep AWSProviderConfig settings over a labelled corpus of image captchas.
+
+Every candidate configuration is scored on accuracy, latency and payload bytes,
+and the Pareto front of those three is reported. The best configuration on the
+front is written out as ``AWSProviderConfig`` JSON.
+
+Two kinds of backends are supported:
+
+* Stand-in backends (the default) answer from the ``*_match`` flags of each
+  ``solution.json``. Tiling and encoding run for real, and network time is
+  modelled with ``StandInLatency``. Their accuracy only depends on the resolver,
+  so the effect of quality on accuracy needs recorded backends.
+* Recorded backends run the real resolvers against a cassette. Record one
+  candidate space with API keys, then replay it as often as needed.
+
+``image_size`` is not swept: resolvers lay their grid over the image they are
+given without resizing it, so it must be the size of the captchas. It is taken
+from the base configuration, and corpus images of another size are rejected.
+
+Run it with ``python -m captchai.core.tuning.autotune --help``.
+"""
+
+import argparse
+import base64
+import io
+import json
+import math
+import os
+import sys
+
+from pathlib import Path
+from time import perf_counter
+
+from moondream.cloud_vl import CloudVL
+from PIL import Image
+from pydantic import BaseModel
+from pydantic import Field
+
+from captchai.core.models.config import AvailableResolvers
+from captchai.core.models.config import AWSProviderConfig
+from captchai.core.models.config import CaptchaGlobalConfig
+from captchai.core.models.config import CassetteConfig
+from captchai.core.models.config import CassetteMode
+from captchai.core.models.config import ResolverName
+from captchai.core.provider.aws.providers import create_resolver
+from captchai.core.provider.aws.resolvers import TILE_CALL_PAUSE
+from captchai.core.provider.aws.tiles import encode_tiles
+from captchai.core.provider.aws.tiles import split_image
+from captchai.core.provider.base.base import AbstractResolver
+
+
+# solution.json flag telling whether a resolver solved the captcha
+MATCH_FLAGS: dict[ResolverName, str] = {
+    AvailableResolvers.GROQ_IMAGE_ONE_SHOOT: "groq_match",
+    AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT: "moondream_match",
+    AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT: "groq_multi_shoot_match",
+    AvailableResolvers.MOONDREAM_IMAGE_MULTI_SHOOT: "moondream_multi_shoot_match",
+}
+
+# Resolvers sending the same request whatever the tile_encoding_quality
+QUALITY_INDEPENDENT_RESOLVERS = {
+    AvailableResolvers.GROQ_IMAGE_ONE_SHOOT,
+    AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT,
+    AvailableResolvers.MOONDREAM_IMAGE_MULTI_SHOOT,
+}
+
+# Only used to reproduce the image encoding of the Moondream client
+_MOONDREAM_ENCODER = CloudVL()
+
+
+class TuningSample(BaseModel):
+    """A labelled image captcha from the corpus."""
+
+    name: str
+    image: str
+    query: str
+    matrix: list[bool]
+    matches: dict[str, bool] = {}
+
+
+class TuningSpace(BaseModel):
+    """Values swept by the autotuner.
+
+    Qualities are only swept for resolvers whose requests depend on them, the
+    others keep the quality of the base configuration.
+
+    Attributes:
+        tile_encoding_qualities: JPEG qualities for the tiles sent to Groq
+        image_resolvers: Candidates for ``default_image_resolver``
+    """
+
+    tile_encoding_qualities: list[int] = [95, 75, 50]
+    image_resolvers: list[ResolverName] = [
+        AvailableResolvers.GROQ_IMAGE_ONE_SHOOT,
+        AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT,
+        AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT,
+        AvailableResolvers.MOONDREAM_IMAGE_MULTI_SHOOT,
+    ]
+
+    def candidates(self, base: AWSProviderConfig) -> list[AWSProviderConfig]:
+        """Returns every combination of the swept values applied to ``base``."""
+        candidates = []
+        for resolver in self.image_resolvers:
+            qualities = self.tile_encoding_qualities
+            if resolver in QUALITY_INDEPENDENT_RESOLVERS:
+                qualities = [base.tile_encoding_quality]
+            for quality in qualities:
+                candidates.append(
+                    base.model_copy(
+                        update={
+                            "tile_encoding_quality": quality,
+                            "default_image_resolver": resolver,
+                        }
+                    )
+                )
+        return candidates
+
+
+class StandInLatency(BaseModel):
+    """Network model of the stand-in backends.
+
+    Attributes:
+        round_trip: Seconds per backend call, excluding the upload
+        upload_bandwidth: Bytes per second of the upload
+    """
+
+    round_trip: float = Field(default=0.5, ge=0)
+    upload_bandwidth: float = Field(default=1_000_000, gt=0)
+
+
+class TuningResult(BaseModel):
+    """Scores of a configuration over the corpus.
+
+    Attributes:
+        config: The evaluated configuration
+        accuracy: Fraction of the challenges solved exactly
+        latency_mean: Mean seconds per challenge
+        latency_p95: 95th percentile of the seconds per challenge
+        payload_bytes: Mean bytes uploaded per challenge
+    """
+
+    config: AWSProviderConfig
+    accuracy: float
+    latency_mean: float
+    latency_p95: float
+    payload_bytes: float
+
+    def dominates(self, other: "TuningResult") -> bool:
+        """Returns whether this result is at least as good on every objective
+        and strictly better on one."""
+        mine = (-self.accuracy, self.latency_p95, self.payload_bytes)
+        theirs = (-other.accuracy, other.latency_p95, other.payload_bytes)
+        return mine != theirs and all(a <= b for a, b in zip(mine, theirs))
+
+
+def load_corpus(directory: Path) -> list[TuningSample]:
+    """Load the ``captcha-*`` directories holding an image and its solution."""
+    samples = []
+    for captcha_dir in sorted(Path(directory).glob("captcha-*")):
+        image_path = captcha_dir / "image.png"
+        solution_path = captcha_dir / "solution.json"
+        if not image_path.exists() or not solution_path.exists():
+            continue
+
+        solution = json.loads(solution_path.read_text())
+        samples.append(
+            TuningSample(
+                name=captcha_dir.name,
+                image=base64.b64encode(image_path.read_bytes()).decode("utf-8"),
+                query=solution["query"],
+                matrix=solution["matrix"],
+                matches={
+                    key: value
+                    for key, value in solution.items()
+                    if key.endswith("_match")
+                },
+            )
+        )
+    return samples
+
+
+def check_image_sizes(corpus: list[TuningSample], config: AWSProviderConfig):
+    """Check that every corpus image has the size the configuration expects.
+
+    Raises:
+        ValueError: If an image has another size
+    """
+    expected = (int(config.image_size[0]), int(config.image_size[1]))
+    for sample in corpus:
+        size = Image.open(io.BytesIO(base64.b64decode(sample.image))).size
+        if size != expected:
+            raise ValueError(
+                f"{sample.name} is {size[0]}x{size[1]}, but image_size is "
+                f"{expected[0]}x{expected[1]}"
+            )
+
+
+def measure_payload(
+    resolver: ResolverName,
+    data: str,
+    config: AWSProviderConfig,
+) -> tuple[int, int]:
+    """Encode ``data`` the way ``resolver`` sends it to its backend.
+
+    Returns:
+        The uploaded bytes and the number of backend calls
+
+    Raises:
+        ValueError: If the payload of the resolver is unknown
+    """
+    if resolver == AvailableResolvers.GROQ_IMAGE_ONE_SHOOT:
+        return len(data), 1
+
+    image = Image.open(io.BytesIO(base64.b64decode(data)))
+    if resolver == AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT:
+        return len(_MOONDREAM_ENCODER.encode_image(image).image_url), 1
+
+    tiles = split_image(image, config.image_size, config.grid_size)
+    if resolver == AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT:
+        encoded = encode_tiles(
+            tiles, config.tile_encoding_workers, config.tile_encoding_quality
+        )
+        return sum(len(tile) for tile in encoded), len(tiles)
+    if resolver == AvailableResolvers.MOONDREAM_IMAGE_MULTI_SHOOT:
+        encoded = [_MOONDREAM_ENCODER.encode_image(tile).image_url for tile in tiles]
+        return sum(len(tile) for tile in encoded), len(tiles)
+
+    raise ValueError(f"Unknown payload for resolver '{resolver}'")
+
+
+class StandInBackend:
+    """Answer from the corpus labels and model the network time.
+
+    A resolver whose ``*_match`` flag is set returns the expected matrix,
+    otherwise its inverse. Decoding, tiling and encoding are timed for real.
+    """
+
+    def __init__(self, latency: StandInLatency | None = None):
+        self.latency = latency or StandInLatency()
+
+    def solve(
+        self,
+        config: AWSProviderConfig,
+        data: str,
+        sample: TuningSample,
+    ) -> tuple[list[bool], float, int]:
+        resolver = config.default_image_resolver
+        if resolver not in MATCH_FLAGS:
+            raise ValueError(f"No stand-in for resolver '{resolver}'")
+
+        start = perf_counter()
+        payload_bytes, calls = measure_payload(resolver, data, config)
+        elapsed = perf_counter() - start
+
+        elapsed += calls * self.latency.round_trip
+        elapsed += payload_bytes / self.latency.upload_bandwidth
+        if calls > 1:
+            elapsed += calls * TILE_CALL_PAUSE
+
+        if sample.matches.get(MATCH_FLAGS[resolver], False):
+            return list(sample.matrix), elapsed, payload_bytes
+        return [not cell for cell in sample.matrix], elapsed, payload_bytes
+
+
+class RecordedBackend:
+    """Run the real resolvers against a cassette.
+
+    Replay reproduces the recorded latency. Recording needs the API keys and
+    calls the backends.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        mode: CassetteMode = CassetteMode.REPLAY,
+        groq_api_key: str = "replay",
+        moondream_api_key: str = "replay",
+    ):
+        self.cassette = CassetteConfig(path=path, mode=mode, replay_latency=True)
+        self.groq_api_key = groq_api_key
+        self.moondream_api_key = moondream_api_key
+        self._resolvers: dict[str, AbstractResolver] = {}
+
+    def _get_resolver(self, config: AWSProviderConfig) -> AbstractResolver:
+        key = config.model_dump_json()
+        if key not in self._resolvers:
+            self._resolvers[key] = create_resolver(
+                config.default_image_resolver,
+                CaptchaGlobalConfig(
+                    groq_api_key=self.groq_api_key,
+                    moondream_api_key=self.moondream_api_key,
+                    aws_provider_config=config,
+                    cassette=self.cassette,
+                ),
+            )
+        return self._resolvers[key]
+
+    def solve(
+        self,
+        config: AWSProviderConfig,
+        data: str,
+        sample: TuningSample,
+    ) -> tuple[list[bool], float, int]:
+        resolver = self._get_resolver(config)
+        start = perf_counter()
+        result = resolver.solve(data, query=sample.query)
+        elapsed = perf_counter() - start
+        payload_bytes, _ = measure_payload(config.default_image_resolver, data, config)
+        return list(result.response), elapsed, payload_bytes
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Returns the nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def evaluate(
+    config: AWSProviderConfig,
+    corpus: list[TuningSample],
+    backend: StandInBackend | RecordedBackend,
+) -> TuningResult:
+    """Solve the whole corpus with one configuration and score it.
+
+    Args:
+        config: Configuration to evaluate
+        corpus: Labelled captchas
+        backend: Backend answering the captchas
+    """
+    solved, latencies, payloads = 0, [], []
+    for sample in corpus:
+        solution, latency, payload_bytes = backend.solve(config, sample.image, sample)
+        solved += solution == sample.matrix
+        latencies.append(latency)
+        payloads.append(payload_bytes)
+
+    return TuningResult(
+        config=config,
+        accuracy=solved / len(corpus),
+        latency_mean=sum(latencies) / len(latencies),
+        latency_p95=percentile(latencies, 0.95),
+        payload_bytes=sum(payloads) / len(payloads),
+    )
+
+
+def pareto_front(results: list[TuningResult]) -> list[TuningResult]:
+    """Returns the results no other result dominates, best accuracy first."""
+    front = [
+        result
+        for result in results
+        if not any(other.dominates(result) for other in results)
+    ]
+    return sorted(
+        front,
+        key=lambda result: (
+            -result.accuracy,
+            result.latency_p95,
+            result.payload_bytes,
+        ),
+    )
+
+
+def autotune(
+    corpus: list[TuningSample],
+    space: TuningSpace | None = None,
+    backend: StandInBackend | RecordedBackend | None = None,
+    base: AWSProviderConfig | None = None,
+) -> list[TuningResult]:
+    """Evaluate every candidate of ``space`` and return the Pareto front.
+
+    Args:
+        corpus: Labelled captchas, as returned by ``load_corpus``
+        space: Values to sweep, the defaults of ``TuningSpace`` if not given
+        backend: Backend answering the captchas, stand-ins if not given
+        base: Configuration the swept values are applied to
+
+    Returns:
+        The Pareto front, best accuracy first
+
+    Raises:
+        ValueError: If the corpus is empty, or its images are not of the
+            ``image_size`` of ``base``
+    """
+    if not corpus:
+        raise ValueError("The tuning corpus is empty")
+
+    base = base or AWSProviderConfig()
+    check_image_sizes(corpus, base)
+    space = space or TuningSpace()
+    backend = backend or StandInBackend()
+    results = [evaluate(config, corpus, backend) for config in space.candidates(base)]
+    return pareto_front(results)
+
+
+def format_report(front: list[TuningResult]) -> str:
+    """Returns the Pareto front as a plain text table."""
+    lines = [f"{'accuracy':>8} {'mean s':>8} {'p95 s':>8} {'KiB':>8}  quality resolver"]
+    for result in front:
+        config = result.config
+        name = getattr(
+            config.default_image_resolver, "value", config.default_image_resolver
+        )
+        lines.append(
+            f"{result.accuracy:>8.2%} {result.latency_mean:>8.2f} "
+            f"{result.latency_p95:>8.2f} {result.payload_bytes / 1024:>8.1f}  "
+            f"{config.tile_encoding_quality} {name}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m captchai.core.tuning.autotune",
+        description=__doc__.split("\n", 1)[0],
+    )
+    parser.add_argument(
+        "--corpus",
+        type=Path,
+        default=Path("tests/visual_captchas_resources"),
+        help="Directory of captcha-* folders with image.png and solution.json",
+    )
+    parser.add_argument(
+        "--space", type=Path, help="JSON file with the TuningSpace to sweep"
+    )
+    parser.add_argument(
+        "--cassette", type=Path, help="Use the real resolvers with this cassette"
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Record the cassette using GROQ_API_KEY and MOONDREAM_API_KEY",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("aws_provider_config.json"),
+        help="Where to write the best AWSProviderConfig",
+    )
+    args = parser.parse_args(argv)
+
+    space = None
+    if args.space is not None:
+        space = TuningSpace.model_validate_json(args.space.read_text())
+
+    backend = StandInBackend()
+    if args.record:
+        if args.cassette is None:
+            parser.error("--record needs --cassette to know where to record")
+        keys = [os.environ.get(name) for name in ("GROQ_API_KEY", "MOONDREAM_API_KEY")]
+        if not all(keys):
+            parser.error("--record needs GROQ_API_KEY and MOONDREAM_API_KEY to be set")
+        backend = RecordedBackend(args.cassette, CassetteMode.RECORD, *keys)
+    elif args.cassette is not None:
+        backend = RecordedBackend(args.cassette)
+
+    front = autotune(load_corpus(args.corpus), space, backend)
+    print(format_report(front))
+    args.output.write_text(front[0].config.model_dump_json(indent=4))
+    print(f"\nWrote {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+import json
+import os
+import statistics
+import zlib
+
+from pathlib import Path
+from timeit import Timer
+
+import numpy as np
+import pytest
+
+
+BASELINES_PATH = Path(__file__).parent / "baselines.json"
+
+# Benchmarks are opt-in: they are slow and only meaningful on a quiet machine.
+ENABLED = os.getenv("CAPTCHAI_BENCHMARK", "") == "1"
+UPDATE = os.getenv("CAPTCHAI_BENCHMARK_UPDATE", "") == "1"
+TOLERANCE = float(os.getenv("CAPTCHAI_BENCHMARK_TOLERANCE", "0.5"))
+MIN_ROUND_TIME = 0.03
+ROUNDS = 11
+CALIBRATION_DATA = bytes(range(256)) * 64
+CALIBRATION_VECTOR = np.array([3.0, 4.0])
+
+
+def pytest_collection_modifyitems(config, items):
+    if ENABLED or UPDATE:
+        return
+    skip = pytest.mark.skip(reason="set CAPTCHAI_BENCHMARK=1 to run benchmarks")
+    for item in items:
+        if "benchmarks" in item.nodeid:
+            item.add_marker(skip)
+
+
+def round_size(timer: Timer) -> int:
+    """Returns how many calls make a round of at least ``MIN_ROUND_TIME``."""
+    number, _ = timer.autorange()
+    number = max(number, 1)
+    while timer.timeit(number) < MIN_ROUND_TIME:
+        number *= 2
+    return number
+
+
+def measure(func) -> tuple[float, float]:
+    """Time ``func`` in rounds alternating with rounds of ``calibration_workload``.
+
+    Returns:
+        The best time per call, in seconds, and the median over the rounds of
+        its ratio to the calibration round just before it
+    """
+    stage, calibration = Timer(func), Timer(calibration_workload)
+    stage_number, calibration_number = round_size(stage), round_size(calibration)
+    times, ratios = [], []
+    for _ in range(ROUNDS):
+        unit = calibration.timeit(calibration_number) / calibration_number
+        elapsed = stage.timeit(stage_number) / stage_number
+        times.append(elapsed)
+        ratios.append(elapsed / unit)
+    return min(times), statistics.median(ratios)
+
+
+def calibration_workload() -> int:
+    """Fixed mix of interpreter, zlib and small numpy work that stage times are
+    divided by."""
+    total = 0
+    for value in range(2000):
+        total += value * value % 7
+    for _ in range(50):
+        total += int(np.linalg.norm(CALIBRATION_VECTOR * 2))
+    return total + len(zlib.compress(CALIBRATION_DATA, 6))
+
+
+@pytest.fixture(scope="session")
+def baselines():
+    stored = {}
+    if BASELINES_PATH.exists():
+        stored = json.loads(BASELINES_PATH.read_text())["stages"]
+    measured: dict[str, float] = {}
+    yield stored, measured
+
+    if UPDATE and measured:
+        rounded = {name: float(f"{value:.4g}") for name, value in measured.items()}
+        stages = dict(sorted({**stored, **rounded}.items()))
+        BASELINES_PATH.write_text(
+            json.dumps({"unit": "calibration_workload", "stages": stages}, indent=4)
+            + "\n"
+        )
+
+
+@pytest.fixture
+def benchmark_stage(baselines):
+    """Measure a CPU stage and compare it with its stored baseline.
+
+    Times are stored relative to ``calibration_workload``, timed in rounds
+    interleaved with the stage, so baselines carry over between machines and a
+    busy machine slows both sides of the ratio. The test fails when the stage is
+    slower than its baseline by more than ``CAPTCHAI_BENCHMARK_TOLERANCE`` (0.5
+    means 50% slower) twice in a row, so that a single noisy measurement does
+    not fail it. With ``CAPTCHAI_BENCHMARK_UPDATE=1`` the measured ratios become
+    the new baselines.
+    """
+    stored, measured = baselines
+
+    def run(name: str, func) -> float:
+        elapsed, relative = measure(func)
+        if UPDATE:
+            measured[name] = relative
+            return elapsed
+
+        if name not in stored:
+            pytest.fail(
+                f"No baseline for '{name}', record one with CAPTCHAI_BENCHMARK_UPDATE=1"
+            )
+        allowed = stored[name] * (1 + TOLERANCE)
+        if relative > allowed:
+            elapsed, relative = min(
+                measure(func), (elapsed, relative), key=lambda timing: timing[1]
+            )
+        measured[name] = relative
+        assert relative <= allowed, (
+            f"'{name}' took {elapsed * 1e6:.1f}us per call, {relative:.3g} "
+            f"calibration units, baseline is {stored[name]:.3g} "
+            f"(allowed {allowed:.3g})"
+        )
+        return elapsed
+
+    return run
@@ -0,0 +1,156 @@
+import base64
+import io
+import json
+
+from pathlib import Path
+
+import pytest
+
+from PIL import Image
+from pydub.utils import which
+
+from captchai.core.models.config import AWSProviderConfig
+from captchai.core.models.config import CaptchaGlobalConfig
+from captchai.core.models.config import GridCaptchaResponse
+from captchai.core.models.grid import GridLLamaVisionResponse
+from captchai.core.models.grid import GridQuadrant
+from captchai.core.provider.aws.resolvers import AWSAudioResolverGroqBackend
+from captchai.core.provider.aws.resolvers import AWSImageResolverMultiShootGroqBackend
+from captchai.core.provider.aws.resolvers import (
+    AWSImageResolverOneShootMoonDreamBackend,
+)
+from captchai.core.provider.aws.tiles import encode_tiles
+
+
+RESOURCES_DIR = Path(__file__).parent.parent
+
+
+def load_images() -> list[str]:
+    images_dir = RESOURCES_DIR / "visual_captchas_resources"
+    return [
+        base64.b64encode(path.read_bytes()).decode("utf-8")
+        for path in sorted(images_dir.glob("captcha-*/image.png"))
+    ]
+
+
+def load_audio() -> list[bytes]:
+    audio_dir = RESOURCES_DIR / "audio_captchas_resources"
+    return [
+        path.read_bytes() for path in sorted(audio_dir.glob("captcha-*/audio.flac"))
+    ]
+
+
+@pytest.fixture(scope="module")
+def config():
+    return CaptchaGlobalConfig(
+        groq_api_key="test-groq-api-key",
+        moondream_api_key="test-moondream-api-key",
+        aws_provider_config=AWSProviderConfig(),
+    )
+
+
+@pytest.fixture(scope="module")
+def images() -> list[str]:
+    return load_images()
+
+
+@pytest.fixture(scope="module")
+def decoded_images(images) -> list[Image.Image]:
+    decoded = [Image.open(io.BytesIO(base64.b64decode(image))) for image in images]
+    for image in decoded:
+        image.load()
+    return decoded
+
+
+def test_base64_decode(benchmark_stage, images):
+    benchmark_stage(
+        "base64_decode", lambda: [base64.b64decode(image) for image in images]
+    )
+
+
+def test_pil_decode(benchmark_stage, images):
+    raw_images = [base64.b64decode(image) for image in images]
+
+    def decode():
+        for raw_image in raw_images:
+            Image.open(io.BytesIO(raw_image)).load()
+
+    benchmark_stage("pil_decode", decode)
+
+
+def test_split_image(benchmark_stage, config, decoded_images):
+    resolver = AWSImageResolverMultiShootGroqBackend(config)
+
+    benchmark_stage(
+        "split_image",
+        lambda: [resolver._split_image(image) for image in decoded_images],
+    )
+
+
+def test_encode_tiles(benchmark_stage, config, decoded_images):
+    resolver = AWSImageResolverMultiShootGroqBackend(config)
+    tiles = [tile for image in decoded_images for tile in resolver._split_image(image)]
+
+    benchmark_stage(
+        "encode_tiles_jpeg", lambda: encode_tiles(tiles, resolver.encoding_workers)
+    )
+
+
+def test_is_point_inside(benchmark_stage):
+    quadrant = GridQuadrant(x_start=0, x_end=213, y_start=0, y_end=213)
+    points = [(x * 10.5, y * 10.5) for x in range(10) for y in range(10)]
+
+    benchmark_stage(
+        "is_point_inside",
+        lambda: [quadrant.is_point_inside(x, y) for x, y in points],
+    )
+
+
+def test_compute_solution_flatten_list(benchmark_stage, config):
+    resolver = AWSImageResolverOneShootMoonDreamBackend(config)
+    objects = resolver._get_quadrants_of_objects(
+        [
+            {"x_min": 0.05, "x_max": 0.25, "y_min": 0.05, "y_max": 0.3},
+            {"x_min": 0.4, "x_max": 0.6, "y_min": 0.35, "y_max": 0.6},
+            {"x_min": 0.7, "x_max": 0.95, "y_min": 0.7, "y_max": 0.95},
+            {"x_min": 0.3, "x_max": 0.7, "y_min": 0.0, "y_max": 0.2},
+        ]
+    )
+
+    benchmark_stage(
+        "compute_solution_flatten_list",
+        lambda: resolver._compute_solution_flatten_list(objects),
+    )
+
+
+def test_grid_response_validation(benchmark_stage):
+    payload = json.dumps(
+        {
+            "row1": ["hat", "bucket", "bed"],
+            "row2": ["curtain", "hat", "clock"],
+            "row3": ["bag", "chair", "hat"],
+        }
+    )
+
+    def validate():
+        response = GridLLamaVisionResponse.model_validate_json(payload)
+        return GridCaptchaResponse(
+            response=response.get_flattened_matches("hat"),
+            confidence=response.get_flattened_confidences("hat"),
+        )
+
+    benchmark_stage("grid_response_validation", validate)
+
+
+@pytest.mark.skipif(
+    which("ffmpeg") is None or which("ffprobe") is None,
+    reason="ffmpeg and ffprobe are required by pydub",
+)
+def test_prepare_flac_audio(benchmark_stage, config):
+    resolver = AWSAudioResolverGroqBackend(config)
+    clips = load_audio()
+
+    benchmark_stage(
+        "prepare_flac_audio",
+        lambda: [resolver._prepare_flac_audio(clip) for clip in clips],
+    )
@@ -1,6 +1,7 @@
 import numpy as np
 import pytest
 
+from captchai.core.models.grid import GridLLamaVisionResponse
 from captchai.core.models.grid import GridQuadrant
 
 
@@ -82,3 +83,36 @@ def test_boundary_points():
     assert not quadrant.is_point_inside(1.0, 2.0)  # Top edge
     assert not quadrant.is_point_inside(0.0, 0.0)  # Bottom-left corner
     assert not quadrant.is_point_inside(2.0, 2.0)  # Top-right corner
+
+
+def test_intersection_area():
+    quadrant = GridQuadrant(x_start=0.0, x_end=2.0, y_start=0.0, y_end=2.0)
+    other = GridQuadrant(x_start=1.0, x_end=3.0, y_start=1.0, y_end=4.0)
+    disjoint = GridQuadrant(x_start=5.0, x_end=6.0, y_start=5.0, y_end=6.0)
+
+    assert quadrant.intersection_area(other) == 1.0
+    assert quadrant.intersection_area(disjoint) == 0.0
+    assert quadrant.fraction_inside(other) == pytest.approx(1 / 6)
+    assert quadrant.fraction_inside(quadrant) == 1.0
+
+
+def test_fraction_inside_degenerate_quadrant():
+    quadrant = GridQuadrant(x_start=0.0, x_end=2.0, y_start=0.0, y_end=2.0)
+    point = GridQuadrant(x_start=1.0, x_end=1.0, y_start=1.0, y_end=1.0)
+
+    assert quadrant.fraction_inside(point) == 1.0
+
+
+def test_flattened_confidences():
+    response = GridLLamaVisionResponse(
+        row1=["hat", "Hats", "bucket"],
+        row2=["", "hat", "top hat"],
+        row3=["bed", "clock", "HAT"],
+    )
+
+    assert response.get_flattened_matches("hat") == [
+        True, False, False, False, True, False, False, False, True
+    ]  # fmt: skip
+    assert response.get_flattened_confidences("hat") == [
+        1.0, 0.5, 1.0, 0.0, 1.0, 0.5, 1.0, 1.0, 1.0
+    ]  # fmt: skip
@@ -0,0 +1,83 @@
+import copy
+
+import pytest
+
+from captchai.core.models.grid import GridLLamaVisionResponse
+from captchai.core.models.labels import LabelIndex
+
+
+@pytest.fixture
+def index():
+    return LabelIndex()
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("Hat.", "hat"),
+        ("  The   Bucket ", "bucket"),
+        ('"an alarm clock!"', "alarm clock"),
+    ],
+)
+def test_normalize(text, expected):
+    assert LabelIndex.normalize(text) == expected
+
+
+@pytest.mark.parametrize(
+    "label,query,kind",
+    [
+        ("Hat", "hat", "exact"),
+        ("hats", "hat", "plural"),
+        ("Buckets.", "bucket", "plural"),
+        ("window", "curtain", "synonym"),
+        ("Windows", "curtain", "synonym"),
+        ("curtain", "curtains", "plural"),
+        ("bucket lid", "bucket", "near_miss"),
+        ("clock", "hat", "mismatch"),
+        ("", "hat", "empty"),
+    ],
+)
+def test_classify(index, label, query, kind):
+    assert index.classify(label, query) == kind
+
+
+def test_custom_synonyms():
+    index = LabelIndex({"sombrero": "hat"})
+
+    assert index.canonical("Sombreros") == "hat"
+    assert index.canonical("window") == "window"
+
+
+def test_stats_record_rescued_matches_and_near_misses(index):
+    for label in ["hat", "hats", "cap", "top hat", "bed"]:
+        index.matches(label, "hat")
+
+    stats = index.stats()
+
+    assert (stats.exact, stats.plural, stats.synonym, stats.mismatch) == (1, 1, 1, 2)
+    assert stats.rescued == {"hats->hat": 1, "cap->hat": 1}
+    assert stats.near_misses == {"top hat->hat": 1}
+
+
+def test_copies_get_their_own_statistics(index):
+    index.matches("hat", "hat")
+
+    copied = copy.deepcopy(index)
+
+    assert copied.stats().exact == 0
+    assert copied.synonyms == index.synonyms
+
+
+def test_grid_response_with_label_index(index):
+    response = GridLLamaVisionResponse(
+        row1=["Hats", "window", "bed"],
+        row2=["bag", "top hat", "clock"],
+        row3=["", "chair", "hat."],
+    )
+
+    matches = response.get_flattened_matches("hat", index)
+    confidences = response.get_flattened_confidences("hat", index)
+
+    assert matches == [True, False, False, False, False, False, False, False, True]
+    assert confidences == [1.0, 1.0, 1.0, 1.0, 0.5, 1.0, 0.0, 1.0, 1.0]
+    assert response.get_flattened_matches("curtain", index)[1] is True
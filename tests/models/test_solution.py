@@ -0,0 +1,92 @@
+import pytest
+
+from pydantic import BaseModel
+from pydantic import ValidationError
+
+from captchai.core.models.config import CaptchaResponse
+from captchai.core.models.config import GridCaptchaResponse
+from captchai.core.models.config import WordsCaptchaResponse
+from captchai.core.models.solution import GridSolution
+
+
+CELLS = [True, False, False, True, False, True, False, True, True]
+
+
+class Holder(BaseModel):
+    solution: GridSolution
+
+
+def test_list_round_trip():
+    solution = GridSolution.from_list(CELLS)
+
+    assert solution.grid_size == 3
+    assert solution.mask == 0b110101001
+    assert solution.to_list() == CELLS
+    assert solution.match_count == 5
+
+
+def test_json_round_trip():
+    solution = GridSolution.from_list(CELLS)
+
+    assert solution.to_json() == '{"mask":425,"grid_size":3}'
+    assert GridSolution.from_json(solution.to_json()) == solution
+
+
+def test_behaves_like_a_list():
+    solution = GridSolution.from_list(CELLS)
+
+    assert solution == CELLS
+    assert list(solution) == CELLS
+    assert len(solution) == 9
+    assert solution[3] is True
+    assert solution[-1] is True
+    assert solution[1:3] == [False, False]
+    with pytest.raises(IndexError):
+        solution[9]
+
+
+@pytest.mark.parametrize(
+    "mask,grid_size",
+    [(-1, 3), (1 << 9, 3), (0, 0)],
+)
+def test_rejects_invalid_masks(mask, grid_size):
+    with pytest.raises(ValueError):
+        GridSolution(mask, grid_size)
+
+
+def test_rejects_non_square_lists():
+    with pytest.raises(ValueError):
+        GridSolution.from_list([True] * 8)
+
+
+def test_is_immutable():
+    solution = GridSolution(1)
+
+    with pytest.raises(AttributeError):
+        solution.mask = 2
+
+
+def test_pydantic_field():
+    from_list = Holder(solution=CELLS)
+    from_compact = Holder.model_validate_json(
+        '{"solution": {"mask": 425, "grid_size": 3}}'
+    )
+
+    assert from_list == from_compact
+    assert from_list.model_dump() == {"solution": CELLS}
+    with pytest.raises(ValidationError):
+        Holder(solution=[1, 0, 1, 0])
+
+
+def test_response_aliases_are_the_cached_parametrisations():
+    assert GridCaptchaResponse is CaptchaResponse[list[bool]]
+    assert WordsCaptchaResponse is CaptchaResponse[list[str]]
+
+
+def test_grid_response_validates_cells():
+    response = GridCaptchaResponse(response=CELLS)
+
+    assert response.confidence is None
+    assert response.model_dump() == {"response": CELLS, "confidence": None}
+    with pytest.raises(ValidationError):
+        GridCaptchaResponse(response=["hat"] * 9)
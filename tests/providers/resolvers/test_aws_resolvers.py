@@ -1,16 +1,27 @@
 import base64
+import io
 import json
 import os
 
 from pathlib import Path
-from time import sleep
+from unittest.mock import Mock
+from unittest.mock import patch
 
 import pytest
 
 from dotenv import load_dotenv
+from groq.types.audio import Transcription
+from moondream.cloud_vl import CloudVL
+from PIL import Image
+from pydub import AudioSegment
+from pydub.utils import which
 
 from captchai.core.models.config import AWSProviderConfig
 from captchai.core.models.config import CaptchaGlobalConfig
+from captchai.core.models.config import CassetteConfig
+from captchai.core.models.config import CassetteMode
+from captchai.core.models.grid import GridQuadrant
+from captchai.core.provider.aws.resolvers import AudioProcessingError
 from captchai.core.provider.aws.resolvers import AudioTranscriptionError
 from captchai.core.provider.aws.resolvers import AWSAudioResolverGroqBackend
 from captchai.core.provider.aws.resolvers import AWSImageResolverMultiShootGroqBackend
@@ -21,10 +32,13 @@ from captchai.core.provider.aws.resolvers import AWSImageResolverOneShootGroqBac
 from captchai.core.provider.aws.resolvers import (
     AWSImageResolverOneShootMoonDreamBackend,
 )
+from captchai.core.provider.aws.resolvers import rate_limit_pause
 
 
 load_dotenv()
 
+CASSETTE_PATH = Path(__file__).parent.parent.parent / "cassettes" / "resolvers.json"
+
 
 def load_audio_test_cases():
     test_cases = []
@@ -87,20 +101,63 @@ def load_image_test_cases(type_of_match: str):
 
 
 # Add a fixture for the config that uses environment variables
+@pytest.fixture
+def offline_config():
+    return CaptchaGlobalConfig(
+        groq_api_key="test-groq-api-key",
+        moondream_api_key="test-moondream-api-key",
+        aws_provider_config=AWSProviderConfig(),
+    )
+
+
+def load_cassette_config() -> CassetteConfig | None:
+    mode = os.getenv("CAPTCHAI_CASSETTE")
+    if not mode:
+        return None
+
+    return CassetteConfig(
+        path=os.getenv("CAPTCHAI_CASSETTE_PATH", CASSETTE_PATH),
+        mode=CassetteMode(mode),
+        replay_latency=os.getenv("CAPTCHAI_CASSETTE_LATENCY") == "1",
+    )
+
+
 @pytest.fixture
 def test_config():
+    cassette = load_cassette_config()
+    replaying = cassette is not None and cassette.mode == CassetteMode.REPLAY
     return CaptchaGlobalConfig(
-        groq_api_key=os.getenv("GROQ_API_KEY", ""),
-        moondream_api_key=os.getenv("MOONDREAM_API_KEY", ""),
+        groq_api_key=os.getenv("GROQ_API_KEY", "replay" if replaying else ""),
+        moondream_api_key=os.getenv("MOONDREAM_API_KEY", "replay" if replaying else ""),
         aws_provider_config=AWSProviderConfig(),
+        cassette=cassette,
     )
 
 
+def test_moondream_one_shoot_confidences(offline_config):
+    resolver = AWSImageResolverOneShootMoonDreamBackend(offline_config)
+    objects = [
+        # Fully inside the first cell
+        GridQuadrant(x_start=10, x_end=100, y_start=10, y_end=100),
+        # Middle point in the centre cell, but half of it spills to the right
+        GridQuadrant(x_start=300, x_end=500, y_start=250, y_end=350),
+    ]
+
+    solution = resolver._compute_solution_flatten_list(objects)
+    confidences = resolver._compute_confidences(objects, solution)
+
+    assert solution == [True, False, False, False, True, False, False, False, False]
+    assert confidences[0] == 1.0
+    assert confidences[4] == pytest.approx(126 / 200)
+    assert confidences[5] == pytest.approx(1 - 74 / 200)
+    assert confidences[8] == 1.0
+
+
 @pytest.mark.parametrize("audio_data,expected_solution", load_audio_test_cases())
 def test_aws_groq_audio_resolver(
     test_config, audio_data: str, expected_solution: list[str]
 ):
-    sleep(15)
+    rate_limit_pause(test_config, 15)
     resolver = AWSAudioResolverGroqBackend(test_config)
     result = resolver.solve(audio_data)
 
@@ -154,7 +211,7 @@ def test_aws_image_groq_resolver(
     expected_query: str,
     groq_match: bool,
 ):
-    sleep(15)
+    rate_limit_pause(test_config, 15)
     resolver = AWSImageResolverOneShootGroqBackend(test_config)
     result = resolver.solve(image_data, query=expected_query)
 
@@ -176,7 +233,7 @@ def test_aws_moondream_image_resolver(
     expected_query: str,
     moondream_match: bool,
 ):
-    sleep(15)
+    rate_limit_pause(test_config, 15)
     resolver = AWSImageResolverOneShootMoonDreamBackend(test_config)
     result = resolver.solve(image_data, query=expected_query)
 
@@ -197,7 +254,7 @@ def test_aws_moondream_multi_shoot_image_resolver(
     expected_query: str,
     moondream_multi_shoot_match: bool,
 ):
-    sleep(15)
+    rate_limit_pause(test_config, 15)
     resolver = AWSImageResolverMultiShootMoonDreamBackend(test_config)
     result = resolver.solve(image_data, query=expected_query)
 
@@ -218,7 +275,7 @@ def test_aws_groq_multi_shoot_image_resolver(
     expected_query: str,
     groq_multi_shoot_match: bool,
 ):
-    sleep(15)
+    rate_limit_pause(test_config, 15)
     resolver = AWSImageResolverMultiShootGroqBackend(test_config)
     result = resolver.solve(image_data, query=expected_query)
 
@@ -228,3 +285,166 @@ def test_aws_groq_multi_shoot_image_resolver(
         result.response == expected_solution
         or evaluation_groq == groq_multi_shoot_match
     ), f"Expected {expected_solution}, but got {result.response}"
+
+
+@pytest.fixture
+def counted_moondream():
+    model = Mock(wraps=CloudVL())
+    model.detect.return_value = {"objects": []}
+    model.query.return_value = {"answer": "no"}
+    return model
+
+
+def test_moondream_encodings_are_reused(offline_config, counted_moondream):
+    image = Image.new("RGB", (640, 640), "white")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    data = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    one_shoot = AWSImageResolverOneShootMoonDreamBackend(offline_config)
+    multi_shoot = AWSImageResolverMultiShootMoonDreamBackend(offline_config)
+    one_shoot.model = multi_shoot.model = counted_moondream
+
+    with patch("captchai.core.provider.aws.resolvers.sleep"):
+        one_shoot.solve(data, query="hat")
+        one_shoot.solve(data, query="bag")
+        multi_shoot.solve_tiles(data, "hat", [0, 4])
+        multi_shoot.solve(data, query="hat")
+
+    # The whole image once, then each of the nine tiles once
+    assert counted_moondream.encode_image.call_count == 1 + 9
+    assert counted_moondream.detect.call_count == 2
+    assert counted_moondream.query.call_count == 2 + 9
+
+
+def test_moondream_encodings_are_per_config():
+    config = CaptchaGlobalConfig(
+        groq_api_key="test-groq-api-key",
+        moondream_api_key="test-moondream-api-key",
+        aws_provider_config=AWSProviderConfig(encoding_cache_challenges=64),
+    )
+    one_shoot = AWSImageResolverOneShootMoonDreamBackend(config)
+    multi_shoot = AWSImageResolverMultiShootMoonDreamBackend(config)
+    copy = config.model_copy(deep=True)
+
+    assert one_shoot.config.encoding_cache is multi_shoot.config.encoding_cache
+    assert config.encoding_cache.max_challenges == 64
+    assert copy.encoding_cache is not config.encoding_cache
+    assert copy.encoding_cache.max_challenges == 64
+
+
+def make_clip(seconds: float) -> str:
+    buffer = io.BytesIO()
+    AudioSegment.silent(duration=int(seconds * 1000), frame_rate=16000).export(
+        buffer, format="flac"
+    )
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def spoken(text: str, start: float, end: float):
+    """Segment and word timestamps for ``text`` spread evenly over a span."""
+    tokens = text.split()
+    step = (end - start) / len(tokens)
+    words = [
+        {"word": token.strip(".").lower(), "start": start + i * step}
+        for i, token in enumerate(tokens)
+    ]
+    for word in words:
+        word["end"] = word["start"] + step
+    return {"start": start, "end": end, "text": f" {text}"}, words
+
+
+def batched_transcription(*spans):
+    segments, words = [], []
+    for segment, segment_words in spans:
+        segments.append(segment)
+        words.extend(segment_words)
+    return Transcription.model_validate(
+        {
+            "text": " ".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "words": words,
+        }
+    )
+
+
+FIRST = "Type the words spoken by me. Pepper. Practice."
+SECOND = "Type the words spoken by me. Majority. Remind."
+
+requires_ffmpeg = pytest.mark.skipif(
+    which("ffmpeg") is None or which("ffprobe") is None,
+    reason="ffmpeg and ffprobe are required by pydub",
+)
+
+
+@requires_ffmpeg
+def test_audio_batch_splits_transcript_per_clip(offline_config):
+    resolver = AWSAudioResolverGroqBackend(offline_config)
+    resolver._groq = Mock()
+    # Clips of 1s and 1.5s joined with a 2s gap: [0, 1] and [3, 4.5]
+    resolver._groq.audio.transcriptions.create.return_value = batched_transcription(
+        spoken(FIRST, 0.05, 0.95), spoken(SECOND, 3.05, 4.45)
+    )
+
+    results = resolver.solve_batch([make_clip(1), make_clip(1.5)])
+
+    assert [result.response for result in results] == [
+        ["pepper", "practice"],
+        ["majority", "remind"],
+    ]
+    create = resolver._groq.audio.transcriptions.create
+    create.assert_called_once()
+    assert create.call_args.kwargs["response_format"] == "verbose_json"
+
+
+@requires_ffmpeg
+def test_audio_batch_cuts_segments_spanning_clips(offline_config):
+    resolver = AWSAudioResolverGroqBackend(offline_config)
+    resolver._groq = Mock()
+    first, first_words = spoken(FIRST, 0.05, 0.95)
+    second, second_words = spoken(SECOND, 3.05, 4.45)
+    merged = {"start": 0.05, "end": 4.45, "text": first["text"] + second["text"]}
+    resolver._groq.audio.transcriptions.create.return_value = batched_transcription(
+        (merged, first_words + second_words)
+    )
+
+    results = resolver.solve_batch([make_clip(1), make_clip(1.5)])
+
+    assert [result.response for result in results] == [
+        ["pepper", "practice"],
+        ["majority", "remind"],
+    ]
+
+
+@requires_ffmpeg
+def test_audio_batch_falls_back_on_ambiguous_clips(offline_config):
+    resolver = AWSAudioResolverGroqBackend(offline_config)
+    resolver._groq = Mock()
+    first, first_words = spoken(FIRST, 0.05, 0.95)
+    # Words without timestamps cannot be attributed to a clip
+    resolver._groq.audio.transcriptions.create.side_effect = [
+        batched_transcription(
+            (first, first_words), ({"start": 3.0, "end": 4.5, "text": SECOND}, [])
+        ),
+        Transcription(text=SECOND),
+    ]
+
+    results = resolver.solve_batch([make_clip(1), make_clip(1.5)])
+
+    assert [result.response for result in results] == [
+        ["pepper", "practice"],
+        ["majority", "remind"],
+    ]
+    single = resolver._groq.audio.transcriptions.create.call_args_list[1]
+    assert "response_format" not in single.kwargs
+
+
+@requires_ffmpeg
+def test_audio_batch_reports_errors_per_clip(offline_config):
+    resolver = AWSAudioResolverGroqBackend(offline_config)
+    resolver._groq = Mock()
+    resolver._groq.audio.transcriptions.create.return_value = Transcription(text=FIRST)
+
+    results = resolver.solve_batch([make_clip(1), "bm90IGF1ZGlv"])
+
+    assert results[0].response == ["pepper", "practice"]
+    assert isinstance(results[1], AudioProcessingError)
@@ -1,3 +1,9 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from threading import Lock
+from time import sleep
 from unittest.mock import Mock
 from unittest.mock import patch
 
@@ -5,9 +11,18 @@ import pytest
 
 from captchai.core.models.config import AWSProviderConfig
 from captchai.core.models.config import CaptchaGlobalConfig
+from captchai.core.models.config import CaptchaResponse
+from captchai.core.models.config import CascadeConfig
+from captchai.core.models.config import EnsembleConfig
 from captchai.core.provider.aws.providers import RESOLVERS
 from captchai.core.provider.aws.providers import AvailableResolvers
+from captchai.core.provider.aws.providers import AWSImageResolverCascade
+from captchai.core.provider.aws.providers import AWSImageResolverEnsemble
 from captchai.core.provider.aws.providers import AWSProviderCaptcha
+from captchai.core.provider.aws.providers import create_resolver
+from captchai.core.provider.aws.providers import register_resolver
+from captchai.core.provider.base.base import AbstractResolver
+from captchai.core.provider.base.base import ResolverCapabilities
 
 
 @pytest.fixture
@@ -62,3 +77,342 @@ class TestAWSProviderCaptcha:
             # Assert
             assert result == "audio_solution"
             mock_resolver_instance.solve.assert_called_once_with("audio_data", query="")
+
+
+def test_provider_solves_respect_rate_limits(mock_config):
+    running, max_running = [0], [0]
+    lock = Lock()
+
+    class SlowResolver(AbstractResolver):
+        capabilities = ResolverCapabilities(
+            max_concurrency=3, rate_limit_group="slow-provider"
+        )
+
+        def solve(self, data: str, **kwargs):
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return data
+
+    with patch.dict(RESOLVERS):
+        register_resolver("slow_provider", SlowResolver)
+        provider = AWSProviderCaptcha(mock_config, "slow_provider")
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            results = list(executor.map(provider.solve, ["data"] * 64))
+
+    assert results == ["data"] * 64
+    assert max_running[0] == 3
+
+
+def fake_resolver(response=None, error=None, block: Event | None = None):
+    instance = Mock()
+
+    def solve(data, **kwargs):
+        if block is not None:
+            block.wait(timeout=5)
+        if error is not None:
+            raise error
+        return CaptchaResponse[list[bool]](response=response)
+
+    instance.solve.side_effect = solve
+    return Mock(return_value=instance)
+
+
+def ensemble_config(**kwargs) -> CaptchaGlobalConfig:
+    return CaptchaGlobalConfig(
+        aws_provider_config=AWSProviderConfig(image_ensemble=EnsembleConfig(**kwargs)),
+        groq_api_key="test-groq-api-key",
+        moondream_api_key="test-moondream-api-key",
+    )
+
+
+MEMBERS = [
+    AvailableResolvers.GROQ_IMAGE_ONE_SHOOT,
+    AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT,
+    AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT,
+]
+
+
+class TestAWSImageResolverEnsemble:
+    def test_majority_vote(self):
+        first = [True, True, False, False, True, False, False, False, False]
+        second = [True, False, True, False, True, False, False, False, False]
+        third = [False, True, True, False, True, False, False, False, True]
+        registry = {
+            MEMBERS[0]: fake_resolver(first),
+            MEMBERS[1]: fake_resolver(second),
+            MEMBERS[2]: fake_resolver(third),
+        }
+
+        with patch.dict(RESOLVERS, registry):
+            ensemble = AWSImageResolverEnsemble(ensemble_config(members=MEMBERS))
+            result = ensemble.solve("data", query="bucket")
+
+        assert result.response == [
+            True, True, True, False, True, False, False, False, False
+        ]  # fmt: skip
+        assert result.report.cell_agreement[4] == 1.0
+        assert result.report.cell_agreement[0] == pytest.approx(2 / 3)
+        assert all(member.status == "ok" for member in result.report.members)
+        assert all(member.latency is not None for member in result.report.members)
+
+    def test_weighted_vote(self):
+        registry = {
+            MEMBERS[0]: fake_resolver([True] * 9),
+            MEMBERS[1]: fake_resolver([False] * 9),
+            MEMBERS[2]: fake_resolver([False] * 9),
+        }
+
+        with patch.dict(RESOLVERS, registry):
+            ensemble = AWSImageResolverEnsemble(
+                ensemble_config(members=MEMBERS, weights=[3.0, 1.0, 1.0])
+            )
+            result = ensemble.solve("data", query="bucket")
+
+        # The heavy member outvotes the other two on its own
+        assert result.response == [True] * 9
+        assert result.report.members[0].status == "ok"
+
+    def test_early_quorum_exit_abandons_slow_member(self):
+        release = Event()
+        registry = {
+            MEMBERS[0]: fake_resolver([True] * 9),
+            MEMBERS[1]: fake_resolver([True] * 9),
+            MEMBERS[2]: fake_resolver([False] * 9, block=release),
+        }
+
+        try:
+            with patch.dict(RESOLVERS, registry):
+                ensemble = AWSImageResolverEnsemble(ensemble_config(members=MEMBERS))
+                result = ensemble.solve("data", query="bucket")
+        finally:
+            release.set()
+
+        assert result.response == [True] * 9
+        assert result.report.early_exit
+        assert result.report.members[2].status == "abandoned"
+
+    def test_early_quorum_exit_cancels_members_not_started(self):
+        release = Event()
+        registry = {
+            MEMBERS[0]: fake_resolver([True] * 9),
+            MEMBERS[1]: fake_resolver([False] * 9, block=release),
+            MEMBERS[2]: fake_resolver([False] * 9),
+        }
+
+        try:
+            with patch.dict(RESOLVERS, registry):
+                ensemble = AWSImageResolverEnsemble(
+                    ensemble_config(
+                        members=MEMBERS, weights=[3.0, 1.0, 1.0], max_workers=1
+                    )
+                )
+                result = ensemble.solve("data", query="bucket")
+        finally:
+            release.set()
+
+        # The single worker is at most busy with the second member
+        assert result.report.early_exit
+        assert result.report.members[1].status in ("cancelled", "abandoned")
+        assert result.report.members[2].status == "cancelled"
+        registry[MEMBERS[2]].return_value.solve.assert_not_called()
+
+    def test_failed_member_abstains(self):
+        registry = {
+            MEMBERS[0]: fake_resolver([True] * 9),
+            MEMBERS[1]: fake_resolver(error=ValueError("boom")),
+            MEMBERS[2]: fake_resolver([False] * 9),
+        }
+
+        with patch.dict(RESOLVERS, registry):
+            ensemble = AWSImageResolverEnsemble(
+                ensemble_config(members=MEMBERS, quorum=0.4)
+            )
+            result = ensemble.solve("data", query="bucket")
+
+        assert result.response == [True] * 9
+        assert result.report.members[1].status == "error"
+        assert result.report.members[1].error == "boom"
+
+    def test_all_members_failing_raises(self):
+        registry = {
+            member: fake_resolver(error=ValueError("boom")) for member in MEMBERS
+        }
+
+        with patch.dict(RESOLVERS, registry):
+            ensemble = AWSImageResolverEnsemble(ensemble_config(members=MEMBERS))
+            with pytest.raises(ValueError, match="boom"):
+                ensemble.solve("data", query="bucket")
+
+    def test_weights_must_match_members(self):
+        with pytest.raises(ValueError, match="Expected 3 weights"):
+            EnsembleConfig(members=MEMBERS, weights=[1.0])
+
+
+def cascade_config(**kwargs) -> CaptchaGlobalConfig:
+    return CaptchaGlobalConfig(
+        aws_provider_config=AWSProviderConfig(image_cascade=CascadeConfig(**kwargs)),
+        groq_api_key="test-groq-api-key",
+        moondream_api_key="test-moondream-api-key",
+    )
+
+
+def tile_resolver(answer: bool):
+    instance = Mock()
+    instance.capabilities = ResolverCapabilities(supports_tiles=True, batch_size=9)
+    instance.solve_tiles.side_effect = lambda data, query, indices: (
+        [answer] * len(indices)
+    )
+    return Mock(return_value=instance)
+
+
+class TestAWSImageResolverCascade:
+    def test_escalates_only_uncertain_cells(self):
+        first = Mock()
+        first.solve.return_value = CaptchaResponse[list[bool]](
+            response=[False] * 9,
+            confidence=[1.0, 0.2, 1.0, 1.0, 1.0, 1.0, 1.0, 0.5, 1.0],
+        )
+        escalation = tile_resolver(True)
+        registry = {
+            AvailableResolvers.GROQ_IMAGE_ONE_SHOOT: Mock(return_value=first),
+            AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT: escalation,
+        }
+
+        with patch.dict(RESOLVERS, registry):
+            cascade = AWSImageResolverCascade(cascade_config())
+            result = cascade.solve("data", query="bucket")
+
+        assert result.escalated_cells == [1, 7]
+        assert result.response == [
+            False, True, False, False, False, False, False, True, False
+        ]  # fmt: skip
+        escalation.return_value.solve_tiles.assert_called_once_with(
+            "data", "bucket", [1, 7]
+        )
+
+    def test_confident_answer_is_not_escalated(self):
+        first = Mock()
+        first.solve.return_value = CaptchaResponse[list[bool]](
+            response=[True] * 9, confidence=[1.0] * 9
+        )
+        escalation = tile_resolver(False)
+        registry = {
+            AvailableResolvers.GROQ_IMAGE_ONE_SHOOT: Mock(return_value=first),
+            AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT: escalation,
+        }
+
+        with patch.dict(RESOLVERS, registry):
+            result = AWSImageResolverCascade(cascade_config()).solve(
+                "data", query="bucket"
+            )
+
+        assert result.response == [True] * 9
+        assert result.escalated_cells == []
+        escalation.return_value.solve_tiles.assert_not_called()
+
+    def test_failure_escalates_every_cell(self):
+        first = Mock()
+        first.solve.side_effect = ValueError("invalid JSON")
+        registry = {
+            AvailableResolvers.GROQ_IMAGE_ONE_SHOOT: Mock(return_value=first),
+            AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT: tile_resolver(True),
+        }
+
+        with patch.dict(RESOLVERS, registry):
+            result = AWSImageResolverCascade(cascade_config()).solve(
+                "data", query="bucket"
+            )
+
+        assert result.response == [True] * 9
+        assert result.escalated_cells == list(range(9))
+
+    def test_sync_solve_from_async_code(self):
+        first = Mock()
+        first.solve.return_value = CaptchaResponse[list[bool]](
+            response=[True] * 9, confidence=[1.0] * 9
+        )
+        registry = {
+            AvailableResolvers.GROQ_IMAGE_ONE_SHOOT: Mock(return_value=first),
+            AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT: tile_resolver(False),
+        }
+
+        async def run():
+            return AWSImageResolverCascade(cascade_config()).solve(
+                "data", query="bucket"
+            )
+
+        with patch.dict(RESOLVERS, registry):
+            result = asyncio.run(run())
+
+        assert result.response == [True] * 9
+
+    def test_escalation_must_support_tiles(self):
+        registry = {
+            AvailableResolvers.GROQ_IMAGE_ONE_SHOOT: Mock(),
+            AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT: Mock(
+                return_value=Mock(capabilities=ResolverCapabilities())
+            ),
+        }
+
+        with patch.dict(RESOLVERS, registry):
+            with pytest.raises(ValueError, match="does not support tile calls"):
+                AWSImageResolverCascade(cascade_config())
+
+
+class ThirdPartyResolver(AbstractResolver):
+    capabilities = ResolverCapabilities(max_concurrency=2, rate_limit_group="acme")
+
+    def solve(self, data: str, **kwargs):
+        return CaptchaResponse[list[bool]](response=[data == "yes"] * 9)
+
+
+class TestResolverRegistry:
+    def test_register_third_party_resolver(self, mock_config):
+        with patch.dict(RESOLVERS):
+            register_resolver("acme_image", ThirdPartyResolver)
+            config = mock_config.model_copy(
+                update={
+                    "aws_provider_config": AWSProviderConfig(
+                        default_image_resolver="acme_image"
+                    )
+                }
+            )
+            provider = AWSProviderCaptcha(
+                config, config.aws_provider_config.default_image_resolver
+            )
+            result = provider.solve("yes", query="bucket")
+
+        assert result.response == [True] * 9
+
+    def test_builtin_names_resolve_to_enum(self):
+        config = AWSProviderConfig(default_image_resolver="groq_image_multi_shoot")
+        assert (
+            config.default_image_resolver == AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT
+        )
+
+    def test_unknown_resolver_names_are_rejected_by_the_config(self):
+        with pytest.raises(ValueError, match="Unknown resolver 'groq_image_oneshot'"):
+            AWSProviderConfig(default_image_resolver="groq_image_oneshot")
+        with pytest.raises(ValueError, match="Unknown resolver 'acme_image'"):
+            EnsembleConfig(
+                members=[AvailableResolvers.GROQ_IMAGE_ONE_SHOOT, "acme_image"]
+            )
+
+    def test_register_rejects_duplicates(self):
+        with patch.dict(RESOLVERS):
+            register_resolver("acme_image", ThirdPartyResolver)
+            with pytest.raises(ValueError, match="already registered"):
+                register_resolver("acme_image", ThirdPartyResolver)
+            register_resolver("acme_image", ThirdPartyResolver, replace=True)
+
+    def test_register_rejects_non_resolvers(self):
+        with pytest.raises(TypeError):
+            register_resolver("acme_image", object)
+
+    def test_unknown_resolver(self, mock_config):
+        with pytest.raises(ValueError, match="Unknown resolver 'missing'"):
+            create_resolver("missing", mock_config)
@@ -0,0 +1,170 @@
+import json
+
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import pytest
+
+from groq.types.chat import ChatCompletion
+from moondream.cloud_vl import CloudVL
+from PIL import Image
+
+from captchai.core.models.config import AWSProviderConfig
+from captchai.core.models.config import CaptchaGlobalConfig
+from captchai.core.models.config import CassetteConfig
+from captchai.core.models.config import CassetteMode
+from captchai.core.provider.aws.resolvers import AWSImageResolverOneShootGroqBackend
+from captchai.core.provider.base.cassette import Cassette
+from captchai.core.provider.base.cassette import CassetteGroq
+from captchai.core.provider.base.cassette import CassetteMissError
+from captchai.core.provider.base.cassette import CassetteMoondream
+from captchai.core.provider.base.cassette import interaction_key
+
+
+GRID = {
+    "row1": ["hat", "bed", "hat"],
+    "row2": ["bag", "hat", "clock"],
+    "row3": ["bucket", "chair", "curtain"],
+}
+
+
+def chat_completion(content: str) -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "llama-3.2-90b-vision-preview",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+        }
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_cassettes():
+    Cassette._open.clear()
+    yield
+    Cassette._open.clear()
+
+
+def messages(prompt: str, image: str = "data:image/jpeg;base64,AAAA"):
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": image}},
+            ],
+        }
+    ]
+
+
+def test_record_then_replay(tmp_path):
+    path = tmp_path / "cassette.json"
+    client = Mock()
+    client.chat.completions.create.return_value = chat_completion("hat")
+
+    recorder = CassetteGroq(client, CassetteConfig(path=path, mode=CassetteMode.RECORD))
+    recorded = recorder.chat.completions.create(model="m", messages=messages("p"))
+
+    Cassette._open.clear()
+    player = CassetteGroq(None, CassetteConfig(path=path, mode=CassetteMode.REPLAY))
+    replayed = player.chat.completions.create(model="m", messages=messages("p"))
+
+    assert replayed == recorded
+    assert replayed.choices[0].message.content == "hat"
+    client.chat.completions.create.assert_called_once()
+    stored = json.loads(path.read_text())
+    assert len(stored["interactions"]) == 1
+
+
+def test_prompt_change_invalidates_recording(tmp_path):
+    path = tmp_path / "cassette.json"
+    client = Mock()
+    client.chat.completions.create.return_value = chat_completion("hat")
+    recorder = CassetteGroq(client, CassetteConfig(path=path, mode=CassetteMode.RECORD))
+    recorder.chat.completions.create(model="m", messages=messages("old prompt"))
+
+    player = CassetteGroq(None, CassetteConfig(path=path, mode=CassetteMode.REPLAY))
+
+    with pytest.raises(CassetteMissError):
+        player.chat.completions.create(model="m", messages=messages("new prompt"))
+
+
+def test_payloads_are_keyed_by_hash():
+    first = interaction_key("e", messages=messages("p", "data:image/jpeg;base64,AAAA"))
+    second = interaction_key("e", messages=messages("p", "data:image/jpeg;base64,BBBB"))
+    audio = interaction_key("e", file=("audio.flac", b"\x00" * 1024))
+
+    assert first != second
+    assert first == interaction_key(
+        "e", messages=messages("p", "data:image/jpeg;base64,AAAA")
+    )
+    assert len(audio) == 64
+
+
+def test_replay_with_recorded_latency(tmp_path):
+    path = tmp_path / "cassette.json"
+    key = interaction_key("moondream.query", args=("image", "question"), kwargs={})
+    Cassette.open(path).put(key, "moondream.query", {"answer": "yes"}, latency=0.25)
+    model = Mock()
+    model.encode_image.side_effect = lambda image: image
+    config = CassetteConfig(path=path, replay_latency=True)
+
+    with patch("captchai.core.provider.base.cassette.sleep") as sleep:
+        answer = CassetteMoondream(model, config).query("image", "question")
+
+    assert answer == {"answer": "yes"}
+    sleep.assert_called_once_with(0.25)
+    model.query.assert_not_called()
+
+
+def test_moondream_is_keyed_on_encoded_image(tmp_path):
+    path = tmp_path / "cassette.json"
+    model = Mock(wraps=CloudVL())
+    model.detect.return_value = {"objects": []}
+    image = Image.new("RGB", (32, 32), "red")
+    recorder = CassetteMoondream(
+        model, CassetteConfig(path=path, mode=CassetteMode.RECORD)
+    )
+    recorder.detect(image, "hat")
+
+    player = CassetteMoondream(CloudVL(), CassetteConfig(path=path))
+
+    assert player.detect(CloudVL().encode_image(image), "hat") == {"objects": []}
+
+
+def test_resolver_replays_offline(tmp_path):
+    def config(mode: CassetteMode) -> CaptchaGlobalConfig:
+        return CaptchaGlobalConfig(
+            groq_api_key="test-groq-api-key",
+            moondream_api_key="test-moondream-api-key",
+            aws_provider_config=AWSProviderConfig(),
+            cassette=CassetteConfig(path=tmp_path / "resolvers.json", mode=mode),
+        )
+
+    with patch("captchai.core.provider.aws.resolvers.Groq") as groq:
+        groq.return_value.chat.completions.create.return_value = chat_completion(
+            json.dumps(GRID)
+        )
+        recorded = AWSImageResolverOneShootGroqBackend(
+            config(CassetteMode.RECORD)
+        ).solve("AAAA", query="hat")
+
+    Cassette._open.clear()
+    with patch("captchai.core.provider.aws.resolvers.Groq") as groq:
+        replayed = AWSImageResolverOneShootGroqBackend(
+            config(CassetteMode.REPLAY)
+        ).solve("AAAA", query="hat")
+        groq.return_value.chat.completions.create.assert_not_called()
+
+    assert replayed == recorded
+    assert replayed.response == [
+        True, False, True, False, True, False, False, False, False
+    ]  # fmt: skip
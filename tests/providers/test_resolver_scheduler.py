@@ -0,0 +1,260 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from threading import Lock
+from time import sleep
+
+import pytest
+
+from captchai.core.models.config import CaptchaResponse
+from captchai.core.provider.base.base import AbstractResolver
+from captchai.core.provider.base.base import ResolverCapabilities
+from captchai.core.provider.base.base import TileResolver
+from captchai.core.provider.base.scheduler import GroupLimit
+from captchai.core.provider.base.scheduler import ResolverScheduler
+
+
+class ConcurrencyCounter:
+    def __init__(self):
+        self.lock = Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def enter(self):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def exit(self):
+        with self.lock:
+            self.running -= 1
+
+
+class CountingResolver(TileResolver):
+    """Fake resolver that records how many calls run at the same time."""
+
+    capabilities = ResolverCapabilities(
+        max_concurrency=2, batch_size=2, rate_limit_group="fake", supports_tiles=True
+    )
+
+    def __init__(self, counter: ConcurrencyCounter | None = None):
+        super().__init__(config=None)
+        self.counter = counter or ConcurrencyCounter()
+        self.tile_calls: list[list[int]] = []
+
+    @property
+    def max_running(self) -> int:
+        return self.counter.max_running
+
+    def solve(self, data: str, **kwargs):
+        self.counter.enter()
+        sleep(0.02)
+        self.counter.exit()
+        return CaptchaResponse[list[bool]](response=[True] * 9)
+
+    def solve_tiles(self, data: str, query: str, indices: list[int]) -> list[bool]:
+        self.counter.enter()
+        sleep(0.02)
+        self.tile_calls.append(list(indices))
+        self.counter.exit()
+        return [index % 2 == 0 for index in indices]
+
+
+class AsyncResolver(AbstractResolver):
+    capabilities = ResolverCapabilities(supports_async=True, max_concurrency=4)
+
+    def __init__(self):
+        super().__init__(config=None)
+
+    def solve(self, data: str, **kwargs):
+        raise AssertionError("The scheduler should use solve_async")
+
+    async def solve_async(self, data: str, **kwargs):
+        return CaptchaResponse[list[str]](response=[data])
+
+
+def test_rate_limit_group_is_shared():
+    counter = ConcurrencyCounter()
+    first = CountingResolver(counter)
+    second = CountingResolver(counter)
+
+    async def run():
+        scheduler = ResolverScheduler()
+        jobs = [(first, "data", {}) for _ in range(4)]
+        jobs += [(second, "data", {}) for _ in range(4)]
+        return await scheduler.solve_many(jobs)
+
+    results = asyncio.run(run())
+
+    assert len(results) == 8
+    assert counter.max_running == 2
+
+
+def test_limits_hold_across_threads_and_event_loops():
+    counter = ConcurrencyCounter()
+    scheduler = ResolverScheduler()
+
+    def run_loop(_):
+        jobs = [(CountingResolver(counter), "data", {}) for _ in range(4)]
+        return asyncio.run(scheduler.solve_many(jobs))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = [
+            result for batch in executor.map(run_loop, range(4)) for result in batch
+        ]
+
+    assert len(results) == 16
+    assert counter.max_running == 2
+
+
+def test_sync_solves_share_the_group_limit():
+    counter = ConcurrencyCounter()
+    scheduler = ResolverScheduler()
+    resolvers = [CountingResolver(counter) for _ in range(2)]
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(
+            executor.map(
+                lambda index: scheduler.solve_sync(resolvers[index % 2], "data"),
+                range(32),
+            )
+        )
+
+    assert len(results) == 32
+    assert counter.max_running == 2
+
+
+def test_group_limit_serves_waiters_in_order():
+    limit = GroupLimit(1)
+    limit.acquire()
+    order: list[int] = []
+
+    async def wait_async(index: int):
+        await limit.acquire_async()
+        order.append(index)
+        limit.release()
+
+    def wait_sync(index: int):
+        limit.acquire()
+        order.append(index)
+        limit.release()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = []
+        for index in range(4):
+            if index % 2:
+                futures.append(executor.submit(asyncio.run, wait_async(index)))
+            else:
+                futures.append(executor.submit(wait_sync, index))
+            # Let each caller queue up before the next one
+            while len(limit._waiters) <= index:
+                sleep(0.001)
+        limit.release()
+        for future in futures:
+            future.result(timeout=5)
+
+    assert order == [0, 1, 2, 3]
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def run():
+        limit = GroupLimit(1)
+        limit.acquire()
+        waiter = asyncio.create_task(limit.acquire_async())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limit.release()
+        # The slot is free again, not held by the cancelled waiter
+        await asyncio.wait_for(limit.acquire_async(), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_abandoned_call_keeps_its_slot():
+    release = Event()
+    started = Event()
+
+    class BlockingResolver(AbstractResolver):
+        capabilities = ResolverCapabilities(rate_limit_group="blocking")
+
+        def __init__(self):
+            super().__init__(config=None)
+
+        def solve(self, data: str, **kwargs):
+            started.set()
+            release.wait(timeout=5)
+            return data
+
+    async def run():
+        scheduler = ResolverScheduler()
+        resolver = BlockingResolver()
+        abandoned = asyncio.create_task(scheduler.solve(resolver, "first"))
+        await asyncio.to_thread(started.wait, 5)
+        abandoned.cancel()
+        following = asyncio.create_task(scheduler.solve(resolver, "second"))
+        await asyncio.sleep(0.05)
+        # The first call is still running, so the second one must wait for it
+        waited = not following.done()
+        release.set()
+        return waited, await following
+
+    try:
+        waited, result = asyncio.run(run())
+    finally:
+        release.set()
+
+    assert waited
+    assert result == "second"
+
+
+def test_tiles_are_batched_and_ordered():
+    resolver = CountingResolver()
+
+    async def run():
+        return await ResolverScheduler().solve_tiles(
+            resolver, "data", "bucket", [8, 1, 4, 3, 0]
+        )
+
+    answers = asyncio.run(run())
+
+    assert answers == [True, False, True, False, True]
+    assert sorted(resolver.tile_calls) == [[0], [4, 3], [8, 1]]
+    assert resolver.max_running <= 2
+
+
+def test_tiles_require_capability():
+    resolver = AsyncResolver()
+
+    async def run():
+        return await ResolverScheduler().solve_tiles(resolver, "data", "bucket", [0])
+
+    with pytest.raises(ValueError, match="does not support tile calls"):
+        asyncio.run(run())
+
+
+def test_native_async_resolver():
+    async def run():
+        return await ResolverScheduler().solve(AsyncResolver(), "data")
+
+    assert asyncio.run(run()).response == ["data"]
+
+
+def test_solve_many_returns_exceptions():
+    class FailingResolver(AbstractResolver):
+        def __init__(self):
+            super().__init__(config=None)
+
+        def solve(self, data: str, **kwargs):
+            raise ValueError("boom")
+
+    async def run():
+        return await ResolverScheduler().solve_many(
+            [(FailingResolver(), "data", {}), (AsyncResolver(), "data", {})]
+        )
+
+    failed, succeeded = asyncio.run(run())
+
+    assert isinstance(failed, ValueError)
+    assert succeeded.response == ["data"]
@@ -0,0 +1,88 @@
+import base64
+import io
+
+from unittest.mock import patch
+
+import pytest
+
+from PIL import Image
+
+from captchai.core.provider.aws.tiles import EncodingCache
+from captchai.core.provider.aws.tiles import encode_tile
+from captchai.core.provider.aws.tiles import encode_tiles
+from captchai.core.provider.aws.tiles import split_image
+from captchai.core.provider.aws.tiles import tile_encoder
+
+
+def make_grid_image(grid_size: int, cell: int) -> Image.Image:
+    """RGBA image whose cells are filled with a colour derived from their index."""
+    image = Image.new("RGBA", (grid_size * cell, grid_size * cell))
+    for index in range(grid_size**2):
+        y, x = divmod(index, grid_size)
+        image.paste(
+            (index * 10, 255 - index * 10, index, 255),
+            (x * cell, y * cell, (x + 1) * cell, (y + 1) * cell),
+        )
+    return image
+
+
+@pytest.mark.parametrize("grid_size", [2, 3, 4])
+def test_split_image_row_major(grid_size):
+    image = make_grid_image(grid_size, cell=20)
+
+    tiles = split_image(image, (grid_size * 20, grid_size * 20), grid_size)
+
+    assert len(tiles) == grid_size**2
+    for index, tile in enumerate(tiles):
+        assert tile.size == (20, 20)
+        assert tile.getpixel((10, 10)) == (index * 10, 255 - index * 10, index, 255)
+
+
+def test_encode_tile_is_rgb_jpeg():
+    tile = make_grid_image(1, cell=16)
+
+    data = encode_tile(tile)
+    decoded = Image.open(io.BytesIO(base64.b64decode(data)))
+
+    assert decoded.format == "JPEG"
+    assert decoded.mode == "RGB"
+    assert decoded.size == (16, 16)
+
+
+def test_encode_tiles_in_parallel_keeps_order():
+    tiles = split_image(make_grid_image(3, cell=20), (60, 60), 3)
+
+    with patch("captchai.core.provider.aws.tiles.os.cpu_count", return_value=4):
+        parallel = encode_tiles(tiles, workers=4)
+
+    assert parallel == encode_tiles(tiles)
+
+
+def test_tile_encoder_is_shared():
+    assert tile_encoder() is tile_encoder()
+
+
+def test_encoding_cache_evicts_least_recent_challenge():
+    cache = EncodingCache(max_challenges=2)
+    cache.put("first", "image", "a")
+    cache.put("second", "image", "b")
+    cache.get("first", "image")
+    cache.put("third", "image", "c")
+
+    assert cache.get("first", "image") == "a"
+    assert cache.get("second", "image") is None
+    assert cache.get("third", "image") == "c"
+
+
+def test_encoding_cache_encodes_once():
+    cache = EncodingCache()
+    calls = []
+
+    def encode():
+        calls.append(1)
+        return "encoded"
+
+    assert cache.get_or_encode("challenge", 0, encode) == "encoded"
+    assert cache.get_or_encode("challenge", 0, encode) == "encoded"
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,99 @@
+import gc
+import os
+import resource
+import tracemalloc
+
+from pathlib import Path
+
+import pytest
+
+
+# Soak runs are opt-in: they take minutes to hours and trace every allocation.
+ENABLED = os.getenv("CAPTCHAI_SOAK", "") == "1"
+SOLVES = int(os.getenv("CAPTCHAI_SOAK_SOLVES", "20000"))
+SAMPLES = int(os.getenv("CAPTCHAI_SOAK_SAMPLES", "10"))
+MAX_TRACED_GROWTH = float(os.getenv("CAPTCHAI_SOAK_MAX_TRACED_MB", "4")) * 2**20
+MAX_RSS_GROWTH = float(os.getenv("CAPTCHAI_SOAK_MAX_RSS_MB", "64")) * 2**20
+TOP_SITES = 10
+
+
+def pytest_collection_modifyitems(config, items):
+    if ENABLED:
+        return
+    skip = pytest.mark.skip(reason="set CAPTCHAI_SOAK=1 to run soak tests")
+    for item in items:
+        if "soak" in item.nodeid:
+            item.add_marker(skip)
+
+
+def current_rss() -> int:
+    """Returns the resident set size of this process in bytes."""
+    statm = Path("/proc/self/statm")
+    if statm.exists():
+        return int(statm.read_text().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    # Peak rather than current RSS, in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class MemoryMonitor:
+    """Samples RSS and traced memory between batches of solves.
+
+    The first sample, taken after a warm-up batch, is the baseline: caches,
+    clients and thread pools are allowed to fill up until then.
+    """
+
+    def __init__(self):
+        self.baseline: tracemalloc.Snapshot | None = None
+        self.rss: list[int] = []
+        self.traced: list[int] = []
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ]
+        )
+
+    def sample(self) -> None:
+        gc.collect()
+        self.rss.append(current_rss())
+        self.traced.append(tracemalloc.get_traced_memory()[0])
+        if self.baseline is None:
+            self.baseline = self._snapshot()
+
+    def growing_sites(self) -> list[str]:
+        """Returns the allocation sites that grew the most since the baseline."""
+        stats = self._snapshot().compare_to(self.baseline, "lineno")
+        return [str(stat) for stat in stats if stat.size_diff > 0][:TOP_SITES]
+
+    @staticmethod
+    def _keeps_growing(samples: list[int], threshold: float) -> bool:
+        # Past the threshold overall, and still growing over the second half
+        middle = samples[len(samples) // 2]
+        return samples[-1] - samples[0] > threshold and samples[-1] > middle
+
+    def check(self) -> None:
+        mib = 2**20
+        report = (
+            f"RSS {self.rss[0] / mib:.1f} -> {self.rss[-1] / mib:.1f} MiB, "
+            f"traced {self.traced[0] / mib:.1f} -> {self.traced[-1] / mib:.1f} MiB"
+        )
+        leaking = self._keeps_growing(
+            self.traced, MAX_TRACED_GROWTH
+        ) or self._keeps_growing(self.rss, MAX_RSS_GROWTH)
+        if leaking:
+            sites = "\n".join(self.growing_sites())
+            pytest.fail(f"Memory keeps growing: {report}\nTop growing sites:\n{sites}")
+        print(report)
+
+
+@pytest.fixture
+def memory_monitor():
+    tracemalloc.start(1)
+    try:
+        yield MemoryMonitor()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,155 @@
+import base64
+import io
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from groq.types.audio import Transcription
+from groq.types.chat import ChatCompletion
+from moondream.cloud_vl import CloudVL
+from PIL import Image
+from pydub import AudioSegment
+from pydub.utils import which
+
+from captchai import CaptchaSolver
+from captchai.core.models.config import AvailableResolvers
+from captchai.core.models.config import AWSProviderConfig
+from captchai.core.models.config import CaptchaGlobalConfig
+from tests.soak.conftest import SAMPLES
+from tests.soak.conftest import SOLVES
+
+
+THREADS = 4
+IMAGE_SIZE = 96
+# More distinct images than the Moondream encoding cache holds, so it churns
+IMAGE_VARIANTS = 16
+GRID = json.dumps(
+    {
+        "row1": ["hat", "bed", "hat"],
+        "row2": ["bag", "hat", "clock"],
+        "row3": ["bucket", "chair", "curtain"],
+    }
+)
+TRANSCRIPT = "Type the words spoken by me. Pepper. Practice."
+
+
+class FakeGroq:
+    """Groq client answering from canned responses, built like real ones."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.audio = SimpleNamespace(
+            transcriptions=SimpleNamespace(create=self._transcribe)
+        )
+
+    def _chat(self, messages, **kwargs):
+        content = GRID if "response_format" in kwargs else "hat"
+        return ChatCompletion.model_validate(
+            {
+                "id": "chatcmpl-soak",
+                "object": "chat.completion",
+                "created": 0,
+                "model": kwargs["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+            }
+        )
+
+    def _transcribe(self, file, **kwargs):
+        return Transcription(text=TRANSCRIPT)
+
+
+class FakeMoondream(CloudVL):
+    """Moondream client that encodes images for real but answers locally."""
+
+    def detect(self, image, object):
+        self.encode_image(image)
+        return {"objects": [{"x_min": 0.1, "x_max": 0.3, "y_min": 0.1, "y_max": 0.3}]}
+
+    def query(self, image, question, stream=False):
+        self.encode_image(image)
+        return {"answer": "yes"}
+
+
+def make_image(variant: int) -> str:
+    image = Image.new("RGBA", (IMAGE_SIZE, IMAGE_SIZE), (variant * 15, 80, 160, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def make_audio() -> str:
+    buffer = io.BytesIO()
+    AudioSegment.silent(duration=300, frame_rate=16000).export(buffer, format="flac")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+@pytest.fixture
+def fake_backends():
+    resolvers = "captchai.core.provider.aws.resolvers"
+    with (
+        patch(f"{resolvers}.create_groq_client", lambda config: FakeGroq()),
+        patch(f"{resolvers}.create_moondream_client", lambda config: FakeMoondream()),
+        # A no-op rather than a Mock, which would record every call
+        patch(f"{resolvers}.sleep", lambda seconds: None),
+    ):
+        yield
+
+
+def make_solvers() -> list[CaptchaSolver]:
+    solvers = []
+    for resolver in [
+        AvailableResolvers.GROQ_IMAGE_ONE_SHOOT,
+        AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT,
+        AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT,
+        AvailableResolvers.MOONDREAM_IMAGE_MULTI_SHOOT,
+        AvailableResolvers.ENSEMBLE_IMAGE,
+        AvailableResolvers.CASCADE_IMAGE,
+    ]:
+        config = CaptchaGlobalConfig(
+            groq_api_key="soak-groq-api-key",
+            moondream_api_key="soak-moondream-api-key",
+            aws_provider_config=AWSProviderConfig(
+                image_size=(IMAGE_SIZE, IMAGE_SIZE),
+                default_image_resolver=resolver,
+            ),
+        )
+        solvers.append(CaptchaSolver(config))
+    return solvers
+
+
+def run_solves(solvers, images, audio, start: int, count: int) -> None:
+    def solve(index: int):
+        solver = solvers[index % len(solvers)]
+        if audio is not None and index % (len(solvers) + 1) == 0:
+            return solver.solve_aws_captcha_audio(audio)
+        return solver.solve_aws_captcha_image(images[index % len(images)], "hat")
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        for result in executor.map(solve, range(start, start + count)):
+            assert result.response
+
+
+def test_solver_memory_stays_flat(fake_backends, memory_monitor):
+    solvers = make_solvers()
+    images = [make_image(variant) for variant in range(IMAGE_VARIANTS)]
+    audio = make_audio() if which("ffmpeg") and which("ffprobe") else None
+    interval = max(SOLVES // SAMPLES, 1)
+
+    # Warm-up: let clients, caches and pools reach their steady state
+    run_solves(solvers, images, audio, 0, interval)
+    memory_monitor.sample()
+    for sample in range(1, SAMPLES + 1):
+        run_solves(solvers, images, audio, sample * interval, interval)
+        memory_monitor.sample()
+
+    memory_monitor.check()
@@ -0,0 +1,271 @@
+import base64
+import io
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from threading import Lock
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from groq.types.audio import Transcription
+from groq.types.chat import ChatCompletion
+from moondream.cloud_vl import CloudVL
+from PIL import Image
+from pydub import AudioSegment
+from pydub.utils import which
+
+from captchai import CaptchaSolver
+from captchai.core.models.config import AvailableResolvers
+from captchai.core.models.config import AWSProviderConfig
+from captchai.core.models.config import CaptchaGlobalConfig
+from captchai.core.provider.aws.resolvers import compute_grid_quadrants
+
+
+THREADS = 32
+SOLVES_PER_THREAD = 12
+TILE = 32
+IMAGE_SIZE = TILE * 3
+HAT = (220, 40, 40)
+BED = (40, 40, 220)
+IMAGE_RESOLVERS = [
+    AvailableResolvers.GROQ_IMAGE_ONE_SHOOT,
+    AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT,
+    AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT,
+    AvailableResolvers.MOONDREAM_IMAGE_MULTI_SHOOT,
+]
+TRANSCRIPT = "Type the words spoken by me. Pepper. Practice."
+needs_ffmpeg = pytest.mark.skipif(
+    not (which("ffmpeg") and which("ffprobe")), reason="ffmpeg is not installed"
+)
+
+
+def decode(url: str) -> Image.Image:
+    return Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+
+
+def label_of(image: Image.Image, x: int = 0, y: int = 0) -> str:
+    red, _, blue = image.convert("RGB").getpixel((x + TILE // 2, y + TILE // 2))
+    return "hat" if red > blue else "bed"
+
+
+def image_labels(image: Image.Image) -> list[str]:
+    return [label_of(image, x * TILE, y * TILE) for y in range(3) for x in range(3)]
+
+
+class FakeGroq:
+    """Groq client that reads its answers from the colours of the images it gets.
+
+    Hats are red and beds are blue, so answers only match the expected solution
+    when the real resolvers encoded and tiled the right image.
+    """
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.audio = SimpleNamespace(
+            transcriptions=SimpleNamespace(create=self._transcribe)
+        )
+
+    def _chat(self, messages, **kwargs):
+        image = decode(messages[0]["content"][1]["image_url"]["url"])
+        if "response_format" in kwargs:
+            labels = image_labels(image)
+            content = json.dumps(
+                {f"row{row + 1}": labels[row * 3 : row * 3 + 3] for row in range(3)}
+            )
+        else:
+            content = label_of(image).capitalize() + "."
+        return ChatCompletion.model_validate(
+            {
+                "id": "chatcmpl-test",
+                "object": "chat.completion",
+                "created": 0,
+                "model": kwargs["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+            }
+        )
+
+    def _transcribe(self, file, **kwargs):
+        return Transcription(text=TRANSCRIPT)
+
+
+class FakeMoondream(CloudVL):
+    """Moondream client that encodes images for real but answers locally."""
+
+    def detect(self, image, object):
+        labels = image_labels(decode(image.image_url))
+        return {
+            "objects": [
+                {
+                    "x_min": (cell % 3 + 0.1) / 3,
+                    "x_max": (cell % 3 + 0.9) / 3,
+                    "y_min": (cell // 3 + 0.1) / 3,
+                    "y_max": (cell // 3 + 0.9) / 3,
+                }
+                for cell, label in enumerate(labels)
+                if label == object
+            ]
+        }
+
+    def query(self, image, question, stream=False):
+        answer = (
+            "Yes." if f" {label_of(decode(image.image_url))}?" in question else "no"
+        )
+        return {"answer": answer}
+
+
+def make_image(mask: int) -> str:
+    image = Image.new("RGB", (IMAGE_SIZE, IMAGE_SIZE))
+    for cell in range(9):
+        x, y = cell % 3 * TILE, cell // 3 * TILE
+        colour = HAT if mask >> cell & 1 else BED
+        image.paste(colour, (x, y, x + TILE, y + TILE))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def make_audio() -> str:
+    buffer = io.BytesIO()
+    AudioSegment.silent(duration=300, frame_rate=16000).export(buffer, format="flac")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+class ClientCounter:
+    def __init__(self):
+        self.groq = 0
+        self.moondream = 0
+        self._lock = Lock()
+
+    def create_groq_client(self, config):
+        with self._lock:
+            self.groq += 1
+        return FakeGroq()
+
+    def create_moondream_client(self, config):
+        with self._lock:
+            self.moondream += 1
+        return FakeMoondream()
+
+
+@pytest.fixture
+def clients():
+    resolvers = "captchai.core.provider.aws.resolvers"
+    counter = ClientCounter()
+    with (
+        patch(f"{resolvers}.create_groq_client", counter.create_groq_client),
+        patch(f"{resolvers}.create_moondream_client", counter.create_moondream_client),
+        patch(f"{resolvers}.sleep", lambda seconds: None),
+    ):
+        yield counter
+
+
+def make_config(**kwargs) -> CaptchaGlobalConfig:
+    return CaptchaGlobalConfig(
+        groq_api_key="test-groq-api-key",
+        moondream_api_key="test-moondream-api-key",
+        aws_provider_config=AWSProviderConfig(
+            image_size=(IMAGE_SIZE, IMAGE_SIZE), **kwargs
+        ),
+    )
+
+
+@pytest.fixture
+def solver(clients):
+    return CaptchaSolver(make_config())
+
+
+def test_solvers_are_shared_across_threads(clients):
+    solvers = [
+        CaptchaSolver(make_config(default_image_resolver=resolver))
+        for resolver in IMAGE_RESOLVERS
+    ]
+    masks = [0b101010101, 0b000111000, 0b110000011, 0b011101110, 0, 0b111111111]
+    images = [make_image(mask) for mask in masks]
+    barrier = Barrier(THREADS)
+
+    def worker(thread_index: int) -> list[tuple[int, str, list[bool]]]:
+        barrier.wait()
+        results = []
+        for solve_index in range(SOLVES_PER_THREAD):
+            index = thread_index * SOLVES_PER_THREAD + solve_index
+            solver = solvers[index % len(solvers)]
+            query = ("hat", "bed")[index // len(solvers) % 2]
+            variant = index % len(images)
+            image = solver.solve_aws_captcha_image(images[variant], query=query)
+            results.append((variant, query, list(image.response)))
+        return results
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        all_results = list(executor.map(worker, range(THREADS)))
+
+    total_solves = sum(len(results) for results in all_results)
+    assert total_solves == THREADS * SOLVES_PER_THREAD
+    for results in all_results:
+        for variant, query, response in results:
+            hats = [masks[variant] >> cell & 1 == 1 for cell in range(9)]
+            assert response == (hats if query == "hat" else [not h for h in hats])
+
+    # One resolver, and therefore one client, per solver and resolver
+    assert (clients.groq, clients.moondream) == (2, 2)
+    assert solvers[0].label_stats().exact > 0
+
+
+@needs_ffmpeg
+def test_solver_uses_the_requested_resolver(solver):
+    result = solver.solve_aws_captcha_audio(make_audio())
+    assert result.response == ["pepper", "practice"]
+
+
+def test_solver_copies_config():
+    config = make_config()
+    solver = CaptchaSolver(config)
+    config.aws_provider_config.grid_size = 4
+
+    assert solver.config.aws_provider_config.grid_size == 3
+
+
+def test_grid_quadrants_are_shared_across_threads():
+    compute_grid_quadrants.cache_clear()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(
+            executor.map(
+                lambda _: compute_grid_quadrants((640, 640), 3), range(THREADS * 4)
+            )
+        )
+
+    assert len(results[0]) == 9
+    assert all(result == results[0] for result in results)
+    assert results[0][4].middle_point_coordinates == (319.5, 319.5)
+
+
+def test_resolvers_share_the_solver_label_index(solver):
+    image = solver._get_aws_provider(AvailableResolvers.GROQ_IMAGE_ONE_SHOOT)
+    audio = solver._get_aws_provider(AvailableResolvers.GROQ_AUDIO)
+
+    assert image._get_resolver().config.label_index is solver.label_index
+    assert audio._get_resolver().config.label_index is solver.label_index
+    assert solver.label_stats().exact == 0
+
+
+def test_label_index_is_the_same_on_every_thread():
+    config = make_config()
+    barrier = Barrier(THREADS)
+
+    def get_index(_):
+        barrier.wait()
+        return config.label_index
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        indexes = list(executor.map(get_index, range(THREADS)))
+
+    assert all(index is indexes[0] for index in indexes)
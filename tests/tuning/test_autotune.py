@@ -0,0 +1,151 @@
+from pathlib import Path
+
+import pytest
+
+from captchai.core.models.config import AvailableResolvers
+from captchai.core.models.config import AWSProviderConfig
+from captchai.core.tuning.autotune import StandInBackend
+from captchai.core.tuning.autotune import StandInLatency
+from captchai.core.tuning.autotune import TuningResult
+from captchai.core.tuning.autotune import TuningSpace
+from captchai.core.tuning.autotune import autotune
+from captchai.core.tuning.autotune import evaluate
+from captchai.core.tuning.autotune import load_corpus
+from captchai.core.tuning.autotune import main
+from captchai.core.tuning.autotune import pareto_front
+
+
+CORPUS_DIR = Path(__file__).parent.parent / "visual_captchas_resources"
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return load_corpus(CORPUS_DIR)[:4]
+
+
+def result(accuracy: float, latency: float, payload: float) -> TuningResult:
+    return TuningResult(
+        config=AWSProviderConfig(),
+        accuracy=accuracy,
+        latency_mean=latency,
+        latency_p95=latency,
+        payload_bytes=payload,
+    )
+
+
+def test_pareto_front_drops_dominated_results():
+    accurate = result(1.0, 10.0, 100)
+    fast = result(0.5, 1.0, 100)
+    small = result(0.5, 10.0, 10)
+    dominated = result(0.5, 10.0, 100)
+
+    front = pareto_front([dominated, small, fast, accurate])
+
+    assert front == [accurate, fast, small]
+
+
+def test_stand_in_accuracy_follows_labels(corpus):
+    backend = StandInBackend(StandInLatency(round_trip=0))
+    for resolver, flag in [
+        (AvailableResolvers.GROQ_IMAGE_ONE_SHOOT, "groq_match"),
+        (AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT, "moondream_match"),
+    ]:
+        config = AWSProviderConfig(default_image_resolver=resolver)
+        expected = sum(sample.matches[flag] for sample in corpus) / len(corpus)
+
+        assert evaluate(config, corpus, backend).accuracy == expected
+
+
+def test_lower_quality_shrinks_tile_payload(corpus):
+    space = TuningSpace(
+        tile_encoding_qualities=[95, 50],
+        image_resolvers=[AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT],
+    )
+    config_95, config_50 = space.candidates(AWSProviderConfig())
+    backend = StandInBackend()
+
+    heavy = evaluate(config_95, corpus, backend)
+    light = evaluate(config_50, corpus, backend)
+
+    assert light.payload_bytes < heavy.payload_bytes
+    assert light.accuracy == heavy.accuracy
+
+
+def test_quality_only_swept_where_it_changes_the_request():
+    space = TuningSpace(tile_encoding_qualities=[95, 50])
+
+    candidates = space.candidates(AWSProviderConfig(tile_encoding_quality=75))
+
+    swept = [
+        (config.default_image_resolver, config.tile_encoding_quality)
+        for config in candidates
+    ]
+    assert swept == [
+        (AvailableResolvers.GROQ_IMAGE_ONE_SHOOT, 75),
+        (AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT, 75),
+        (AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT, 95),
+        (AvailableResolvers.GROQ_IMAGE_MULTI_SHOOT, 50),
+        (AvailableResolvers.MOONDREAM_IMAGE_MULTI_SHOOT, 75),
+    ]
+
+
+def test_autotune_writes_best_config(corpus, tmp_path):
+    space = TuningSpace(
+        tile_encoding_qualities=[75],
+        image_resolvers=[
+            AvailableResolvers.GROQ_IMAGE_ONE_SHOOT,
+            AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT,
+        ],
+    )
+    space_path = tmp_path / "space.json"
+    space_path.write_text(space.model_dump_json())
+    output = tmp_path / "config.json"
+
+    front = autotune(corpus, space)
+    main(
+        [
+            "--corpus",
+            str(CORPUS_DIR),
+            "--space",
+            str(space_path),
+            "--output",
+            str(output),
+        ]
+    )
+
+    assert front[0].accuracy >= front[-1].accuracy
+    config = AWSProviderConfig.model_validate_json(output.read_text())
+    assert config.image_size == (640, 640)
+    assert config.default_image_resolver in (
+        AvailableResolvers.GROQ_IMAGE_ONE_SHOOT,
+        AvailableResolvers.MOONDREAM_IMAGE_ONE_SHOOT,
+    )
+
+
+def test_autotune_rejects_empty_corpus():
+    with pytest.raises(ValueError):
+        autotune([])
+
+
+def test_autotune_rejects_images_of_another_size(corpus):
+    with pytest.raises(ValueError, match="is 640x640, but image_size is 320x320"):
+        autotune(corpus, base=AWSProviderConfig(image_size=(320, 320)))
+
+
+def test_record_needs_a_cassette(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--record"])
+
+    assert exit_info.value.code == 2
+    assert "--record needs --cassette" in capsys.readouterr().err
+
+
+def test_record_needs_api_keys(capsys, monkeypatch, tmp_path):
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.setenv("MOONDREAM_API_KEY", "key")
+
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--record", "--cassette", str(tmp_path / "responses.json")])
+
+    assert exit_info.value.code == 2
+    assert "GROQ_API_KEY and MOONDREAM_API_KEY" in capsys.readouterr().err